@@ -0,0 +1,156 @@
+# Run many queries from a JSONL file through the graph with bounded concurrency.
+import argparse
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from src.resources import load_environment
+from src.telemetry import Histogram
+
+# Fields tried in order when --id-field / --query-field are not given.
+ID_FIELDS = ("id",)
+QUERY_FIELDS = ("query", "question")
+
+# Percentiles are computed over this many most recent latencies.
+LATENCY_SAMPLE_SIZE = 10_000
+
+
+def read_queries(path: Path, id_field: Optional[str], query_field: Optional[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (id, query) pairs one line at a time."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line {line_number}")
+                continue
+            ids = (id_field,) if id_field else ID_FIELDS
+            fields = (query_field,) if query_field else QUERY_FIELDS
+            query_id = next((str(record[k]) for k in ids if record.get(k) is not None), f"line-{line_number}")
+            query = next((record[k] for k in fields if record.get(k)), None)
+            if query is None:
+                print(f"Skipping line {line_number}: no query field")
+                continue
+            yield query_id, query
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """Ids that already have a successful result in the output file."""
+    done = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line; that query simply runs again.
+                continue
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def run_one(query_id: str, query: str) -> Dict:
+    # Imported on first use so the graph picks up .env settings loaded in main().
+    from src.graph import run_graph
+
+    started = time.perf_counter()
+    try:
+        result = run_graph(query)
+        record = {
+            "id": query_id,
+            "query": query,
+            "final_answer": result.get("final_answer", ""),
+            "db_lookup_path": result.get("db_lookup_path", ""),
+        }
+    except Exception as e:
+        record = {"id": query_id, "query": query, "error": f"{type(e).__name__}: {e}"}
+    record["latency_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(input_path: Path, output_path: Path, workers: int = 4,
+              id_field: Optional[str] = None, query_field: Optional[str] = None) -> Dict:
+    done = completed_ids(output_path)
+    if done:
+        print(f"Resuming: {len(done)} queries already answered in {output_path}")
+
+    # Terminate a truncated last line before appending new records.
+    if output_path.exists() and output_path.stat().st_size:
+        with open(output_path, "rb") as f:
+            f.seek(-1, 2)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    from src.graph import configure_branch_pool
+
+    configure_branch_pool(workers)
+    stats = {"processed": 0, "failed": 0, "skipped": 0}
+    latencies = Histogram(window=LATENCY_SAMPLE_SIZE)
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        if needs_newline:
+            out.write("\n")
+
+        def drain(pending, return_when):
+            finished, pending = wait(pending, return_when=return_when)
+            for future in finished:
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                stats["failed" if record.get("error") else "processed"] += 1
+                latencies.observe(record["latency_s"])
+            return pending
+
+        # Keep at most two queries per worker in flight so the input is never read ahead.
+        pending = set()
+        for query_id, query in read_queries(input_path, id_field, query_field):
+            if query_id in done:
+                stats["skipped"] += 1
+                continue
+            done.add(query_id)
+            pending.add(pool.submit(run_one, query_id, query))
+            if len(pending) >= workers * 2:
+                pending = drain(pending, FIRST_COMPLETED)
+        while pending:
+            pending = drain(pending, FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - started
+    latency = latencies.summary()
+    answered = stats["processed"] + stats["failed"]
+    stats.update({
+        "elapsed_s": round(elapsed, 2),
+        "throughput_qps": round(answered / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_p50_s": latency["p50"],
+        "latency_p95_s": latency["p95"],
+        "latency_max_s": latency["max"],
+    })
+    return stats
+
+
+def main() -> None:
+    load_environment()
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of customer queries.")
+    parser.add_argument("input", type=Path, help="JSONL file with one query per line")
+    parser.add_argument("output", type=Path, help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="number of concurrent graph runs")
+    parser.add_argument("--id-field", help=f"id field name (default: first of {', '.join(ID_FIELDS)})")
+    parser.add_argument("--query-field", help=f"query field name (default: first of {', '.join(QUERY_FIELDS)})")
+    args = parser.parse_args()
+
+    stats = run_batch(args.input, args.output, args.workers, args.id_field, args.query_field)
+    print("--- BATCH SUMMARY ---")
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# Offline benchmark: the real graph, SQLite database and FAISS index with a fake LLM and search backend.
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src import fake_backends
+from src.fake_backends import configure_environment, load_parts
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+BENCHMARK_DIR = PROJECT_ROOT / "benchmarks"
+BASELINE_PATH = BENCHMARK_DIR / "baseline.json"
+
+DEFAULT_CONCURRENCY = "1,4,8"
+DEFAULT_TOLERANCE = 0.25
+# Latency changes smaller than this are noise, whatever the relative change.
+ABSOLUTE_SLACK_MS = 5.0
+
+
+def build_corpus(parts: List[Dict[str, str]], extra_files: List[Path], limit: Optional[int],
+                 seed: int) -> List[Tuple[str, str]]:
+    """Queries covering every lookup path: part numbers, names, vehicles and open questions."""
+    queries = []
+    for part in parts:
+        pn, name = part["part_number"], part["name"]
+        queries.append((f"{pn}-number", f"Do you have {pn} in stock?"))
+        queries.append((f"{pn}-name", f"How much is the {name}?"))
+        vehicle = (part.get("compatible_models") or "").split(",")[0].strip()
+        words = vehicle.split()
+        if len(words) >= 3 and words[-1][:4].isdigit():
+            kind = " ".join(name.split()[:2]).lower()
+            queries.append((f"{pn}-vehicle", f"{kind} for a {words[-1][:4]} {' '.join(words[:-1])}"))
+        queries.append((f"{pn}-open", f"What would you recommend for {part['category'].lower()} maintenance?"))
+    if extra_files:
+        from batch_run import read_queries
+        for path in extra_files:
+            queries.extend(read_queries(path, None, None))
+    random.Random(seed).shuffle(queries)
+    return queries[:limit] if limit else queries
+
+
+def install_fakes(args, parts: List[Dict[str, str]]) -> None:
+    fake_backends.install_fakes(parts, args.llm_latency, args.search_latency, args.embedding_latency,
+                                args.seed, args.model_embeddings)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+def run_queries(queries: List[Tuple[str, str]], concurrency: int, use_async: bool) -> Tuple[List[float], float, int]:
+    """(latencies in ms, wall seconds, error count) for one pass over the corpus."""
+    from src.graph import arun_graph, configure_branch_pool, run_graph
+
+    failures: List[str] = []
+
+    def timed(query: str) -> float:
+        started = time.perf_counter()
+        try:
+            run_graph(query)
+        except Exception as e:
+            failures.append(query)
+            print(f"Query failed: {e}")
+        return (time.perf_counter() - started) * 1000
+
+    async def atimed(query: str, gate: asyncio.Semaphore) -> float:
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await arun_graph(query)
+            except Exception as e:
+                failures.append(query)
+                print(f"Query failed: {e}")
+            return (time.perf_counter() - started) * 1000
+
+    async def arun_all() -> List[float]:
+        gate = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(atimed(query, gate) for _, query in queries))
+
+    started = time.perf_counter()
+    if use_async:
+        latencies = asyncio.run(arun_all())
+    else:
+        configure_branch_pool(concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, [query for _, query in queries]))
+    return latencies, time.perf_counter() - started, len(failures)
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS.
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def probe_cold_start(args) -> Dict[str, float]:
+    """Runs in a fresh process: import the graph, then answer one query."""
+    started = time.perf_counter()
+    from src.graph import run_graph
+    imported = time.perf_counter()
+    install_fakes(args, load_parts())
+    run_graph("Do you have OF-001 in stock?")
+    finished = time.perf_counter()
+    return {"import_s": round(imported - started, 3), "first_query_s": round(finished - imported, 3),
+            "total_s": round(finished - started, 3)}
+
+
+def measure_cold_start(argv: List[str]) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--cold-start-probe", *argv],
+        capture_output=True, text=True, cwd=PROJECT_ROOT, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def graph_shape(app) -> Dict:
+    """Nodes and edges of the compiled graph, and whether the router prunes branches.
+
+    Per-node numbers are only comparable between runs of the same graph.
+    """
+    from src.nodes.router import ROUTER_ENABLED
+
+    graph = app.get_graph()
+    return {
+        "nodes": sorted(graph.nodes),
+        "edges": sorted(f"{edge.source}->{edge.target}" for edge in graph.edges),
+        "router": ROUTER_ENABLED,
+    }
+
+
+def run_benchmark(args, argv: List[str]) -> Dict:
+    from src.graph import app, run_graph
+    from src.telemetry import metrics
+
+    parts = load_parts()
+    queries = build_corpus(parts, args.queries_file, args.limit, args.seed)
+    install_fakes(args, parts)
+    levels = sorted({1, *(int(level) for level in args.concurrency.split(","))})
+    node_names = [name for name in app.get_graph().nodes if not name.startswith("__")]
+
+    report = {
+        "settings": {
+            "llm_latency": args.llm_latency, "search_latency": args.search_latency,
+            "model_embeddings": args.model_embeddings, "queries": len(queries), "async": args.use_async,
+        },
+        "graph": graph_shape(app),
+        "cold_start": measure_cold_start(argv),
+    }
+    print(f"Cold start: {report['cold_start']['total_s']}s")
+
+    # Load the index, the parts index and the models before anything is timed.
+    run_graph("warm-up query for the benchmark")
+    report["throughput"] = {}
+    for level in levels:
+        metrics.reset()
+        latencies, wall, errors = run_queries(queries, level, args.use_async)
+        print(f"Concurrency {level}: {len(queries) / wall:.2f} queries/s, {errors} errors")
+        report["throughput"][str(level)] = {
+            "qps": round(len(queries) / wall, 2), "p95_ms": percentile(latencies, 0.95), "errors": errors,
+        }
+        if level == 1:
+            report["end_to_end"] = {
+                "p50_ms": percentile(latencies, 0.50), "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99), "errors": errors,
+            }
+            report["nodes"] = {}
+            for name in node_names:
+                summary = metrics.histogram("latency_ms", kind="node", name=name)
+                if summary:
+                    report["nodes"][name] = {"p50_ms": summary["p50"], "p95_ms": summary["p95"], "calls": summary["count"]}
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def flatten(report: Dict) -> Dict[str, Tuple[float, bool]]:
+    """Comparable numbers as {key: (value, higher_is_better)}."""
+    values = {f"end_to_end.{k}": (v, False) for k, v in report["end_to_end"].items() if k.endswith("_ms")}
+    values.update({f"nodes.{name}.p95_ms": (n["p95_ms"], False) for name, n in report["nodes"].items()})
+    values.update({f"throughput.{level}.qps": (t["qps"], True) for level, t in report["throughput"].items()})
+    values["cold_start.total_s"] = (report["cold_start"]["total_s"], False)
+    if report.get("peak_rss_mb"):
+        values["peak_rss_mb"] = (report["peak_rss_mb"], False)
+    return values
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    current = flatten(report)
+    for key, (old, higher_is_better) in flatten(baseline).items():
+        if key not in current or not old:
+            continue
+        new = current[key][0]
+        if higher_is_better:
+            worse = new < old * (1 - tolerance)
+        else:
+            slack = ABSOLUTE_SLACK_MS if key.endswith("_ms") else 0.0
+            worse = new > old * (1 + tolerance) + slack
+        if worse:
+            regressions.append(f"{key}: {old} -> {new}")
+    if report["end_to_end"]["errors"]:
+        regressions.append(f"end_to_end.errors: {report['end_to_end']['errors']}")
+    return regressions
+
+
+def print_report(report: Dict) -> None:
+    e2e = report["end_to_end"]
+    print(f"\nEnd to end: p50 {e2e['p50_ms']} ms, p95 {e2e['p95_ms']} ms, p99 {e2e['p99_ms']} ms")
+    print("\n| node | calls | p50 ms | p95 ms |\n| --- | --- | --- | --- |")
+    for name, node in report["nodes"].items():
+        print(f"| {name} | {node['calls']} | {node['p50_ms']} | {node['p95_ms']} |")
+    print("\n| concurrency | queries/s | p95 ms |\n| --- | --- | --- |")
+    for level, row in report["throughput"].items():
+        print(f"| {level} | {row['qps']} | {row['p95_ms']} |")
+    print(f"\nCold start: {report['cold_start']}")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the graph offline and compare with a stored baseline.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="seconds per fixture web search")
+    parser.add_argument("--model-embeddings", action="store_true",
+                        help="embed queries with the local model instead of hash-based vectors")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per fake embedding call")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated concurrency levels")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use arun_graph instead of threads")
+    parser.add_argument("--queries-file", type=Path, action="append", default=[],
+                        help="extra JSONL queries (same format as batch_run.py); repeatable")
+    parser.add_argument("--limit", type=int, help="use at most this many queries")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--with-caches", action="store_true", help="keep the result, web and embedding caches on")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative regression")
+    parser.add_argument("--output", type=Path, help="also write the report as JSON")
+    parser.add_argument("--cold-start-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    configure_environment(args.with_caches)
+
+    if args.cold_start_probe:
+        print(json.dumps(probe_cold_start(args)))
+        sys.exit(0)
+
+    probe_argv = [a for a in sys.argv[1:] if a != "--save-baseline"]
+    report = run_benchmark(args, probe_argv)
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline["settings"] != report["settings"]:
+            print(f"Baseline was recorded with {baseline['settings']}; rerun with the same options or --save-baseline")
+            sys.exit(2)
+        if baseline.get("graph") != report["graph"]:
+            print(f"Baseline was recorded against another graph ({baseline.get('graph')}); "
+                  f"record a new one with --save-baseline")
+            sys.exit(2)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
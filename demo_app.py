@@ -1,7 +1,52 @@
 import streamlit as st
-from src.state import AgentState
-import time
-from src.graph import app # Your compiled LangGraph
+
+
+# Compiled graph, LLM clients, embedding model and FAISS index, built once per server process
+# and shared by every session and rerun.
+@st.cache_resource
+def load_pipeline():
+    from src.resources import load_environment, resources
+
+    load_environment()
+    from src.graph import stream_graph
+
+    resources.warmup()
+    return stream_graph
+
+
+NODE_LABELS = {
+    "router": "🧭 Router",
+    "db_agent": "🔍 Database Specialist",
+    "rag_agent": "📖 RAG Expert",
+    "web_search": "📡 Web Search",
+    "web_agent": "🌐 Web Researcher",
+    "compiler_agent": "📝 Compiler",
+}
+
+
+# One line describing what a node actually produced.
+def summarize_update(node: str, update: dict) -> str:
+    if node == "router":
+        parts = ", ".join(update.get("found_parts") or []) or "none"
+        return f"branches {', '.join(update.get('route', []))} ({update.get('route_reason', '')}); parts: {parts}"
+    if node == "db_agent":
+        parts = update.get("db_results") or []
+        if not parts:
+            return f"no parts ({update.get('db_error', 'no data')}) via {update.get('db_lookup_path', '?')}"
+        found = ", ".join(f"{p['part_number']} {p['name']} ({p['price']}, {p['status']})" for p in parts)
+        return f"{found} via {update.get('db_lookup_path', '?')}"
+    if node == "rag_agent":
+        text = str(update.get("rag_results") or "No manuals found.")
+        return text if len(text) <= 300 else text[:300] + "..."
+    if node == "web_search":
+        results = update.get("web_search_results") or {}
+        return f"{results.get('market', {}).get('offers_found', 0)} market offers found"
+    if node == "web_agent":
+        return (update.get("web_results") or {}).get("comparison", "No market data found.")
+    if node == "compiler_agent":
+        return "answer ready"
+    return str(update)
+
 
 # Page Configuration
 st.set_page_config(page_title="AutoPart AI | Enterprise Demo", layout="wide", page_icon="⚙️")
@@ -15,69 +60,85 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+stream_graph = load_pipeline()
+
 st.title("🚗 AutoPart AI: Multi-Agent Inventory Suite")
 st.markdown("---")
 
 # Sidebar for Demo Controls
 with st.sidebar:
     st.header("Settings")
-    st.info("Model: Gemini 1.5 Flash")
-    st.success("Agents: DB + RAG + Web + Compiler")
+    st.info("Model: Gemini 2.5 Flash")
+    st.success("Agents: Router + DB + RAG + Web + Compiler")
     if st.button("Clear History"):
         st.session_state.messages = []
+        st.session_state.last_result = None
 
 # Initialize Chat History
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "last_result" not in st.session_state:
+    st.session_state.last_result = None
+
+for message in st.session_state.messages:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
 
 # User Input
 if input := st.chat_input("Ask about a spare part (e.g. 'Do you have Alternator 130A Remanufactured?')"):
     # Add user message to chat
     st.session_state.messages.append({"role": "user", "content": input})
-    
+
     with st.chat_message("user"):
         st.markdown(input)
 
     # Agent Execution
     with st.chat_message("assistant"):
-        # Creating a placeholder for the "thinking" process
-        thinking_expander = st.expander("🔍 **Agent Reasoning Trace**", expanded=True)
-        
-        with st.spinner("Analyzing request..."):
-            # 1. Run the Graph
-            # We use a container to show progress in the expander
-            with thinking_expander:
-                step_1 = st.empty()
-                step_1.write("📡 *Consulting SQLite Inventory...*")
-                
-                # Execute the full graph
-                result = app.invoke({"input": input})
-                
-                step_1.write("✅ **Database Specialist:** Found part details.")
-                st.divider()
-                st.write("📖 **RAG Expert:** Inventory parts retrieved.")
-                st.divider()
-                st.write("🌐 **Web Researcher:** Market price comparison complete.")
-
-            # 2. Display Final Response
-            st.markdown("### Final Recommendation")
-            st.write(result["final_answer"])
-            
-            # Save to history
-            st.session_state.messages.append({"role": "assistant", "content": result["final_answer"]})
+        trace = st.expander("🔍 **Agent Reasoning Trace**", expanded=True)
+        status = trace.empty()
+        status.write("⏳ *Routing the request...*")
+        st.markdown("### Final Recommendation")
+        answer_box = st.empty()
+        timing = st.empty()
+
+        # Each node's real output appears as soon as it finishes; the answer streams in.
+        answer, result, first_output_ms = "", None, None
+        for event in stream_graph(input):
+            if first_output_ms is None:
+                first_output_ms = event.elapsed_ms
+            if event.kind == "node":
+                duration = f"{event.duration_ms:.0f} ms" if event.duration_ms is not None else "n/a"
+                trace.write(f"✅ **{NODE_LABELS.get(event.node, event.node)}** ({duration}): "
+                            f"{summarize_update(event.node, event.data)}")
+                status.write(f"⏳ *Working... {event.elapsed_ms / 1000:.1f}s*")
+            elif event.kind == "token":
+                answer += event.data
+                answer_box.markdown(answer + "▌")
+            else:
+                result = event.data
+                status.write("✅ *Served from the answer cache.*" if event.node == "answer_cache" else "✅ *Done.*")
+
+        final_answer = result.get("final_answer", "") if result else answer
+        answer_box.markdown(final_answer)
+        timing.caption(f"First output after {first_output_ms or 0:.0f} ms, "
+                       f"complete after {event.elapsed_ms:.0f} ms")
+
+        # Save to history; the latest state feeds the tabs below across reruns.
+        st.session_state.messages.append({"role": "assistant", "content": final_answer})
+        st.session_state.last_result = result
 
 # Show step-by-step data in tabs below the chat for the "Tech Proof"
-if "messages" in st.session_state and len(st.session_state.messages) > 0:
+result = st.session_state.last_result
+if result:
     st.write("### Data Source Breakdown")
     tab1, tab2, tab3 = st.tabs(["Database (SQL)", "Technical (RAG)", "Market (Web)"])
-    
-    # We use the latest result for the tabs
-    try:
-        with tab1:
-            st.code(result.get("db_results", "No data"), language="text")
-        with tab2:
-            st.write(result.get("rag_results", "No manuals found."))
-        with tab3:
-            st.write(result.get("web_results", "No market data found."))
-    except:
-        pass
\ No newline at end of file
+
+    with tab1:
+        if result.get("db_results"):
+            st.dataframe(result["db_results"])
+        else:
+            st.write(result.get("db_error") or "No data")
+    with tab2:
+        st.write(result.get("rag_results") or "No manuals found.")
+    with tab3:
+        st.write(result.get("web_results") or "No market data found.")
@@ -0,0 +1,120 @@
+# Recall-vs-latency report for the FAISS index types, to pick index settings for a corpus size.
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.tools.vector_index import (
+    IndexSettings, SearchSettings, apply_search_settings, build_faiss_index, load_for_update, resolve_nlist,
+    stored_vectors,
+)
+
+VECTORSTORE_PATH = Path(__file__).resolve().parent / "data" / "vectorstore"
+
+NPROBE_VALUES = (1, 2, 4, 8, 16, 32, 64, 128)
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256)
+
+
+def synthetic_corpus(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors, a stand-in for a catalog library that is not indexed yet."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+# Queries are perturbed corpus vectors, so they land near real chunks like real questions do.
+def sample_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), count)]
+    scale = float(np.std(vectors)) * 0.1
+    return (picked + scale * rng.normal(size=picked.shape)).astype(np.float32)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, float]:
+    """Single-query latency percentiles and mean recall@k against exact search."""
+    latencies, hits = [], 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[0]) & set(truth[i]))
+    latencies.sort()
+    return {
+        "recall": round(hits / (len(queries) * k), 4),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+
+
+def run_report(vectors: np.ndarray, query_count: int, k: int, nlist: int, hnsw_m: int) -> List[Dict]:
+    queries = sample_queries(vectors, query_count)
+    k = min(k, len(vectors))
+    rows = []
+
+    start = time.perf_counter()
+    flat = build_faiss_index(vectors, IndexSettings("flat"))
+    build_s = time.perf_counter() - start
+    _, truth = flat.search(queries, k)
+    rows.append(dict(index="flat", params="exact", build_s=round(build_s, 2), **measure(flat, queries, truth, k)))
+
+    start = time.perf_counter()
+    ivf = build_faiss_index(vectors, IndexSettings("ivf", nlist=nlist))
+    build_s = time.perf_counter() - start
+    cells = resolve_nlist(nlist, len(vectors))
+    for nprobe in [n for n in NPROBE_VALUES if n <= cells]:
+        apply_search_settings(ivf, SearchSettings(nprobe=nprobe))
+        rows.append(dict(index="ivf", params=f"nlist={cells} nprobe={nprobe}", build_s=round(build_s, 2),
+                         **measure(ivf, queries, truth, k)))
+
+    start = time.perf_counter()
+    hnsw = build_faiss_index(vectors, IndexSettings("hnsw", hnsw_m=hnsw_m))
+    build_s = time.perf_counter() - start
+    for ef_search in EF_SEARCH_VALUES:
+        apply_search_settings(hnsw, SearchSettings(ef_search=ef_search))
+        rows.append(dict(index="hnsw", params=f"M={hnsw_m} efSearch={ef_search}", build_s=round(build_s, 2),
+                         **measure(hnsw, queries, truth, k)))
+    return rows
+
+
+def print_table(rows: List[Dict], vector_count: int, dim: int, k: int) -> None:
+    print(f"Recall@{k} vs single-query latency over {vector_count} vectors of dimension {dim}\n")
+    print("| index | params | build s | recall | p50 ms | p95 ms |")
+    print("| --- | --- | --- | --- | --- | --- |")
+    for row in rows:
+        print(f"| {row['index']} | {row['params']} | {row['build_s']} | {row['recall']} | "
+              f"{row['p50_ms']} | {row['p95_ms']} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recall and latency of flat, IVF and HNSW indexes.")
+    parser.add_argument("--vectorstore", type=Path, default=VECTORSTORE_PATH, help="index whose vectors are used")
+    parser.add_argument("--synthetic", type=int, help="use this many synthetic vectors instead of the vectorstore")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=500, help="number of sampled queries")
+    parser.add_argument("-k", type=int, default=4, help="neighbours per query (the RAG top-k)")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF cells, 0 = about 4*sqrt(vectors)")
+    parser.add_argument("--hnsw-m", type=int, default=IndexSettings().hnsw_m, help="HNSW neighbours per node")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads (1 matches one request per core)")
+    parser.add_argument("--output", type=Path, help="also write the rows as JSON")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    corpus: Optional[np.ndarray] = None
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic, args.dim)
+    else:
+        index, labels = load_for_update(args.vectorstore)
+        if index is None:
+            raise SystemExit(f"No index at {args.vectorstore}; run ingest_docs.py or pass --synthetic N")
+        corpus = stored_vectors(index, sorted(labels))
+
+    report = run_report(corpus, args.queries, args.k, args.nlist, args.hnsw_m)
+    print_table(report, len(corpus), corpus.shape[1], min(args.k, len(corpus)))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"vectors": len(corpus), "dimension": int(corpus.shape[1]), "k": args.k, "rows": report}, f, indent=2)
@@ -2,60 +2,248 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pdfplumber
 from langchain_core.documents import Document as LCDocument
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 
+from src.tools.embedding_cache import cached_embeddings
+from src.tools.lexical_index import LEXICAL_INDEX_NAME, build_lexical_index
+from src.tools.rag_tool import EMBEDDING_MODEL
+from src.tools.vector_index import (
+    DOCSTORE_FILE, INDEX_TYPES, META_FILE, IndexSettings, build_faiss_index, index_kind, legacy_documents,
+    load_for_update, load_vector_index, read_meta, save_vector_index, stored_vectors, update_faiss_index,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DATA_DIR = PROJECT_ROOT / "data"
+VECTORSTORE_PATH = DATA_DIR / "vectorstore"
+MANIFEST_NAME = "manifest.json"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Pages handed to one worker process at a time.
+PAGES_PER_TASK = 25
+
 
-def load_pdf_with_pdfplumber(file_path: str) -> list[LCDocument]:
-    """Extract text from PDF using pdfplumber."""
+def load_pdf_with_pdfplumber(file_path: str, first_page: int = 1, last_page: Optional[int] = None,
+                             source: Optional[str] = None) -> list[LCDocument]:
+    """Extract text from PDF using pdfplumber, optionally for a page range only."""
     docs = []
     with pdfplumber.open(file_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
+        pages = pdf.pages[first_page - 1:last_page]
+        for page_num, page in enumerate(pages, start=first_page):
             text = page.extract_text()
             if text:
                 docs.append(
                     LCDocument(
                         page_content=text,
-                        metadata={"source": file_path, "page": page_num},
+                        metadata={"source": source or file_path, "page": page_num},
                     )
                 )
     return docs
 
 
-# Orchestrate PDF loading, splitting, and vectorstore build.
-def ingest_documents():
-    FILE_PATH = r"C:\Users\henry.garcia\Documents\agent_spare_car_parts\agent_car_spare_parts\data\catalog.pdf"
-    
-    # Load PDF
-    print(f"Loading PDF from {FILE_PATH}...")
-    docs = load_pdf_with_pdfplumber(FILE_PATH)
-    print(f"Loaded {len(docs)} pages from PDF")
+def discover_pdfs(data_dir: Path) -> List[Path]:
+    """Every PDF under the data directory, in a stable order."""
+    return sorted(path for path in data_dir.rglob("*.pdf") if VECTORSTORE_PATH not in path.parents)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(vectorstore_path: Path) -> dict:
+    try:
+        with open(vectorstore_path / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(vectorstore_path: Path, manifest: dict) -> None:
+    # Write to a temporary file first so a crash never leaves a half-written manifest.
+    tmp_path = vectorstore_path / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, vectorstore_path / MANIFEST_NAME)
+
+
+def parse_pdfs(paths: List[Path], sources: List[str], workers: int) -> Dict[str, List[LCDocument]]:
+    """Parse pages of all given PDFs in a process pool, split into page-range tasks."""
+    tasks = []
+    for path, source in zip(paths, sources):
+        with pdfplumber.open(path) as pdf:
+            page_count = len(pdf.pages)
+        for first in range(1, page_count + 1, PAGES_PER_TASK):
+            tasks.append((str(path), first, min(first + PAGES_PER_TASK - 1, page_count), source))
+
+    pages: Dict[str, List[LCDocument]] = {source: [] for source in sources}
+    if not tasks:
+        return pages
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(load_pdf_with_pdfplumber, *task) for task in tasks]
+        # Results are collected in submission order, so pages stay in order.
+        for (_, _, _, source), future in zip(tasks, futures):
+            pages[source].extend(future.result())
+    return pages
 
-    # Split documents
+
+def chunk_documents(pages: List[LCDocument]) -> Tuple[List[LCDocument], List[str]]:
+    """Split pages into chunks and give each a content-derived id."""
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
     )
-    splits = text_splitter.split_documents(docs)
-    print(f"Split into {len(splits)} chunks")
+    chunks = text_splitter.split_documents(pages)
+    ids, seen = [], Counter()
+    for chunk in chunks:
+        key = f"{chunk.metadata['source']}\n{chunk.page_content}"
+        # Repeated identical chunks in one file still need distinct ids.
+        seen[key] += 1
+        ids.append(hashlib.sha256(f"{key}\n{seen[key]}".encode("utf-8")).hexdigest()[:32])
+    return chunks, ids
+
 
-    # Create embeddings using HuggingFace (no API key needed)
+def _load_model() -> HuggingFaceEmbeddings:
     print("Loading HuggingFace embeddings...")
-    embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
 
-    # Create FAISS vectorstore
-    vectorstore_path = Path(FILE_PATH).parent / "vectorstore"
+
+# Orchestrate PDF discovery, parsing, splitting and incremental vectorstore updates.
+def ingest_documents(data_dir: Path = DATA_DIR, vectorstore_path: Path = VECTORSTORE_PATH,
+                     workers: Optional[int] = None, rebuild: bool = False,
+                     settings: IndexSettings = IndexSettings()) -> None:
     vectorstore_path.mkdir(parents=True, exist_ok=True)
+    manifest = {} if rebuild else load_manifest(vectorstore_path)
+    if manifest.get("embedding_model") != EMBEDDING_MODEL:
+        # Vectors from another model (or an index without a manifest) cannot be reused.
+        manifest = {}
+    known_files = manifest.get("files", {})
+
+    pdfs = discover_pdfs(data_dir)
+    print(f"Found {len(pdfs)} PDF catalogs under {data_dir}")
+
+    files, changed = {}, []
+    for path in pdfs:
+        source = path.relative_to(data_dir).as_posix()
+        digest = file_sha256(path)
+        previous = known_files.get(source)
+        if previous and previous["sha256"] == digest:
+            files[source] = previous
+        else:
+            changed.append((path, source, digest))
+    removed = sorted(set(known_files) - {path.relative_to(data_dir).as_posix() for path in pdfs})
+    print(f"{len(changed)} new or changed, {len(files)} unchanged, {len(removed)} removed")
+
+    index_exists = (vectorstore_path / "index.faiss").exists() and bool(manifest)
+    meta = read_meta(vectorstore_path)
+    same_settings = meta.get("settings") == settings._asdict()
+    migrated = (vectorstore_path / DOCSTORE_FILE).exists()
+    if not changed and not removed and index_exists and same_settings and migrated:
+        print("✓ Vectorstore is up to date")
+        return
+
+    # Parse only the catalogs that changed.
+    new_chunks: Dict[str, LCDocument] = {}
+    if changed:
+        pages = parse_pdfs([p for p, _, _ in changed], [s for _, s, _ in changed], workers or os.cpu_count() or 1)
+        for path, source, digest in changed:
+            chunks, ids = chunk_documents(pages[source])
+            print(f"  {source}: {len(pages[source])} pages, {len(chunks)} chunks")
+            files[source] = {"sha256": digest, "chunk_ids": ids}
+            new_chunks.update(zip(ids, chunks))
+
+    # Re-ingesting identical chunks reuses cached vectors; the model loads only on a miss.
+    embeddings = cached_embeddings(_load_model, EMBEDDING_MODEL)
+
+    wanted_ids = list(dict.fromkeys(chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]))
+    if not wanted_ids:
+        print("No catalog text to index")
+        for name in ("index.faiss", "index.pkl", DOCSTORE_FILE, META_FILE, LEXICAL_INDEX_NAME, MANIFEST_NAME):
+            (vectorstore_path / name).unlink(missing_ok=True)
+        return
+
+    old_index, old_labels = load_for_update(vectorstore_path) if index_exists else (None, {})
+    old_ids = set(old_labels.values())
+    stale = len(old_ids - set(wanted_ids))
+    if stale:
+        # Chunks of removed catalogs and old versions of changed ones.
+        print(f"Dropping {stale} stale vectors...")
+
+    # Chunks whose content did not change keep their vectors; only new ids are embedded.
+    kept = [chunk_id for chunk_id in wanted_ids if chunk_id in old_ids]
+    to_add = [chunk_id for chunk_id in new_chunks if chunk_id not in old_ids]
+    new_vectors = None
+    if to_add:
+        print(f"Embedding {len(to_add)} new chunks...")
+        new_vectors = np.asarray(embeddings.embed_documents([new_chunks[c].page_content for c in to_add]),
+                                 dtype=np.float32)
+
+    # The stored index is updated in place while its type and build settings stay the same;
+    # IVF centroids are reused until the corpus has doubled since they were trained.
+    trained_on = meta.get("trained_vectors", 0)
+    total = len(kept) + len(to_add)
+    labels = None
+    if (old_index is not None and same_settings and index_kind(old_index) == settings.index_type
+            and (new_vectors is None or old_index.d == new_vectors.shape[1])
+            and not (settings.index_type == "ivf" and total > 2 * trained_on)):
+        if new_vectors is None:
+            new_vectors = np.empty((0, old_index.d), dtype=np.float32)
+        # None when vectors cannot be removed in place (HNSW); that case is rebuilt below.
+        labels = update_faiss_index(old_index, old_labels, set(kept), new_vectors, to_add)
+    if labels is not None:
+        index = old_index
+        print(f"Updated {settings.index_type} index in place: {len(to_add)} added, {stale} removed")
+    else:
+        label_of = {chunk_id: label for label, chunk_id in old_labels.items()}
+        parts = []
+        if kept:
+            parts.append(stored_vectors(old_index, [label_of[chunk_id] for chunk_id in kept]))
+        if to_add:
+            parts.append(new_vectors)
+        vectors = np.concatenate(parts)
+        print(f"Building {settings.index_type} index over {len(vectors)} vectors...")
+        index = build_faiss_index(vectors, settings)
+        labels = dict(enumerate(kept + to_add))
+        trained_on = len(vectors)
+
+    new_docs = {chunk_id: new_chunks[chunk_id] for chunk_id in to_add}
+    if kept and not (vectorstore_path / DOCSTORE_FILE).exists():
+        # First run after the pickle docstore: move the kept chunks into SQLite.
+        new_docs.update(legacy_documents(vectorstore_path, kept))
+    save_vector_index(vectorstore_path, index, labels, new_docs, settings, {"trained_vectors": trained_on})
+    save_manifest(vectorstore_path, {"embedding_model": EMBEDDING_MODEL, "files": files})
 
-    print("Creating FAISS vectorstore...")
-    vectorstore = FAISS.from_documents(splits, embeddings)
-    vectorstore.save_local(str(vectorstore_path))
-    print(f"✓ Vectorstore saved to {vectorstore_path}")
+    # The BM25 side of hybrid retrieval is rebuilt from the same chunks.
+    vectorstore = load_vector_index(vectorstore_path, embeddings, mmap=False)
+    build_lexical_index(vectorstore, vectorstore_path)
+    print(f"✓ Vectorstore saved to {vectorstore_path} ({index.ntotal} vectors, {settings.index_type})")
 
 
 if __name__ == "__main__":
-    ingest_documents()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest PDF catalogs into the FAISS vectorstore.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="directory searched for PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the manifest and rebuild from scratch")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=IndexSettings().index_type,
+                        help="flat (exact), ivf (trained centroids) or hnsw (graph)")
+    parser.add_argument("--nlist", type=int, default=IndexSettings().nlist, help="IVF cells, 0 = about 4*sqrt(vectors)")
+    parser.add_argument("--hnsw-m", type=int, default=IndexSettings().hnsw_m, help="HNSW neighbours per node")
+    args = parser.parse_args()
+    settings = IndexSettings(args.index_type, args.nlist, args.hnsw_m)
+    ingest_documents(args.data_dir, workers=args.workers, rebuild=args.rebuild, settings=settings)
@@ -0,0 +1,62 @@
+# Load generator for server.py: concurrent POST /query requests and a latency/status summary.
+import argparse
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from benchmark import build_corpus, percentile
+from src.fake_backends import load_parts
+
+
+def post_query(url: str, query: str, timeout: float) -> Tuple[int, float, bool]:
+    """(HTTP status, latency ms, coalesced) for one request; status 0 when the request failed."""
+    request = urllib.request.Request(
+        f"{url}/query", data=json.dumps({"query": query}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = json.loads(response.read())
+            return response.status, (time.perf_counter() - started) * 1000, body.get("coalesced", False)
+    except urllib.error.HTTPError as e:
+        return e.code, (time.perf_counter() - started) * 1000, False
+    except OSError:
+        return 0, (time.perf_counter() - started) * 1000, False
+
+
+def run_load(url: str, queries: List[str], concurrency: int, timeout: float) -> Dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda query: post_query(url, query, timeout), queries))
+    wall = time.perf_counter() - started
+    ok = [latency for status, latency, _ in results if status == 200]
+    return {
+        "requests": len(results),
+        "statuses": dict(Counter(status for status, _, _ in results)),
+        "coalesced": sum(1 for _, _, coalesced in results if coalesced),
+        "qps": round(len(results) / wall, 2),
+        "p50_ms": percentile(ok, 0.50),
+        "p95_ms": percentile(ok, 0.95),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send concurrent queries to a running server.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight")
+    parser.add_argument("--limit", type=int, default=40, help="distinct queries from the benchmark corpus")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="send every query this many times, shuffled, so identical queries overlap")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per request")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    queries = [query for _, query in build_corpus(load_parts(), [], args.limit, args.seed)] * args.repeat
+    random.Random(args.seed).shuffle(queries)
+    print(json.dumps(run_load(args.url.rstrip("/"), queries, args.concurrency, args.timeout), indent=2))
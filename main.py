@@ -1,14 +1,28 @@
-from dotenv import load_dotenv
+import argparse
 
-from src.graph import run_graph
+from src.resources import load_environment
 
+EXAMPLE_QUERY = "I need  an Alternator 130A Remanufactured"
 
 
-# Run a single example query through the graph.
+# Run a single query (the example query by default) through the graph.
 def main() -> None:
-    load_dotenv()
-    query = "I need  an Alternator 130A Remanufactured"
-    result = run_graph(query)
+    parser = argparse.ArgumentParser(description="Answer one spare-parts query.")
+    parser.add_argument("query", nargs="?", default=EXAMPLE_QUERY, help="question to answer")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the import time of each module instead of answering")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from src.profiling import print_startup_profile
+        print_startup_profile()
+        return
+
+    load_environment()
+    # Imported after .env is loaded so its settings reach the graph's configuration.
+    from src.graph import run_graph
+
+    result = run_graph(args.query)
     print(result["final_answer"])
 
 
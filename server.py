@@ -0,0 +1,203 @@
+# Local HTTP service around the graph: warm resources, coalesced identical queries and a bounded queue.
+import argparse
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+# Graph runs executing at once, and distinct queries allowed to wait for one; beyond that, 429.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+# SERVER_FAKE_BACKENDS=1 swaps the LLM, web search and embeddings for the stand-ins in src/fake_backends.py.
+FAKE_BACKENDS = os.getenv("SERVER_FAKE_BACKENDS", "0") == "1"
+MAX_QUERY_CHARS = 2000
+RETRY_AFTER_SECONDS = 1
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=MAX_QUERY_CHARS)
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    route: List[str]
+    db_results: List[Dict[str, Any]]
+    timed_out: List[str]
+    # True when the answer came from a run started by an identical request still in flight.
+    coalesced: bool
+    elapsed_ms: float
+
+
+class Saturated(Exception):
+    pass
+
+
+class GraphService:
+    """Runs at most `workers` graphs at once with up to `queue_size` more waiting.
+
+    Requests whose normalized query is already running or queued wait for that run instead
+    of starting their own, and do not take a queue slot.
+    """
+
+    def __init__(self, run: Callable[[str], Awaitable[Dict[str, Any]]], key: Callable[[str], str],
+                 workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE):
+        self._run_graph = run
+        self._key = key
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = asyncio.Semaphore(workers)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.running = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending) - self.running
+
+    @property
+    def saturated(self) -> bool:
+        return len(self._pending) >= self.workers + self.queue_size
+
+    async def _run(self, query: str) -> Dict[str, Any]:
+        async with self._slots:
+            self.running += 1
+            try:
+                return await self._run_graph(query)
+            finally:
+                self.running -= 1
+
+    async def answer(self, query: str):
+        """(final state, coalesced); raises Saturated when the queue is full."""
+        key = self._key(query)
+        task = self._pending.get(key)
+        coalesced = task is not None
+        if task is None:
+            if self.saturated:
+                raise Saturated()
+            task = asyncio.create_task(self._run(query))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # A client that disconnects must not cancel the run other requests are waiting for.
+        return await asyncio.shield(task), coalesced
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": self.running, "queued": self.queued,
+                "workers": self.workers, "queue_size": self.queue_size}
+
+
+def create_app(workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE,
+               fake_backends: bool = FAKE_BACKENDS) -> FastAPI:
+    state: Dict[str, Any] = {"ready": False, "service": None}
+    if fake_backends:
+        from src.fake_backends import configure_environment
+
+        # Lift the provider rate limits before src is imported; the result caches stay on.
+        configure_environment(with_caches=True)
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        # src is imported here so settings made before startup (e.g. by the fakes) are seen.
+        from src.cache import normalize_query
+        from src.graph import arun_graph
+        from src.resources import load_environment, resources
+
+        load_environment()
+        if fake_backends:
+            from src.fake_backends import install_fakes, load_parts
+
+            install_fakes(load_parts())
+        state["service"] = GraphService(arun_graph, normalize_query, workers, queue_size)
+        started = time.perf_counter()
+        await asyncio.to_thread(resources.warmup)
+        print(f"--- SERVER READY in {time.perf_counter() - started:.1f}s "
+              f"({workers} workers, queue {queue_size}{', fake backends' if fake_backends else ''}) ---")
+        state["ready"] = True
+        yield
+        state["ready"] = False
+
+    app = FastAPI(title="AutoPart AI", lifespan=lifespan)
+
+    @app.post("/query", response_model=QueryResponse)
+    async def query(request: QueryRequest) -> QueryResponse:
+        from src.telemetry import metrics
+
+        service: GraphService = state["service"]
+        if not state["ready"]:
+            raise HTTPException(503, "warming up", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        started = time.perf_counter()
+        try:
+            result, coalesced = await service.answer(request.query)
+        except Saturated:
+            metrics.increment("server_requests", status="rejected")
+            raise HTTPException(429, "too many queries in flight",
+                                headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+        except Exception as e:
+            metrics.increment("server_requests", status="error")
+            raise HTTPException(500, f"{type(e).__name__}: {e}"[:300])
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        metrics.increment("server_requests", status="coalesced" if coalesced else "ok")
+        metrics.observe("server_latency_ms", elapsed_ms)
+        return QueryResponse(
+            answer=result.get("final_answer", ""),
+            route=result.get("route") or [],
+            db_results=result.get("db_results") or [],
+            timed_out=result.get("timed_out") or [],
+            coalesced=coalesced,
+            elapsed_ms=elapsed_ms,
+        )
+
+    # Liveness: the process is serving requests.
+    @app.get("/health")
+    async def health() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    # Readiness: resources are warm and there is room in the queue.
+    @app.get("/ready")
+    async def ready():
+        service = state["service"]
+        body = {"ready": state["ready"], **(service.stats() if service else {})}
+        if not state["ready"] or service.saturated:
+            return JSONResponse(body, status_code=503)
+        return body
+
+    @app.get("/metrics")
+    async def metrics_report() -> Dict[str, Any]:
+        from src.telemetry import metrics_snapshot
+
+        service = state["service"]
+        return {"server": service.stats() if service else {}, **metrics_snapshot()}
+
+    return app
+
+
+# For `uvicorn server:app`, built from the environment on first access; main() builds its own from the
+# command line instead, so a process only ever holds one app and one GraphService.
+def __getattr__(name: str) -> Any:
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the spare-parts assistant over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="graph runs executing at once")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE,
+                        help="distinct queries allowed to wait before requests get 429")
+    parser.add_argument("--fake-backends", action="store_true", default=FAKE_BACKENDS,
+                        help="local stand-ins for the LLM, web search and embeddings (load tests)")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.workers, args.queue_size, args.fake_backends), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# Persistent SQLite-backed result cache for whole answers and individual node outputs.
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from src.resources import DB_PATH
+from src.telemetry import record_cache
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_PATH = Path(os.getenv("AGENT_CACHE_PATH", PROJECT_ROOT / "data" / "cache" / "agent_cache.db"))
+CACHE_ENABLED = os.getenv("AGENT_CACHE", "1") != "0"
+MAX_ENTRIES = int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "5000"))
+# Market data goes stale quickly, so anything that includes it expires on this TTL.
+WEB_TTL_SECONDS = float(os.getenv("WEB_CACHE_TTL", "900"))
+
+DB_FILE = DB_PATH
+VECTORSTORE_FILES = (
+    PROJECT_ROOT / "data" / "vectorstore" / "index.faiss",
+    PROJECT_ROOT / "data" / "vectorstore" / "index.pkl",
+    PROJECT_ROOT / "data" / "vectorstore" / "docstore.db",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    version   TEXT,
+    expires   REAL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache_entries (last_used);
+"""
+
+
+def _file_version(paths: Iterable[Path]) -> str:
+    parts = []
+    for path in paths:
+        try:
+            stat = Path(path).stat()
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except FileNotFoundError:
+            parts.append("missing")
+    return "|".join(parts)
+
+
+# Entries derived from the inventory database are invalid once the file changes.
+def db_version() -> str:
+    return "db=" + _file_version([DB_FILE])
+
+
+# Entries derived from the vectorstore are invalid once the index is rebuilt.
+def rag_version() -> str:
+    return "rag=" + _file_version(VECTORSTORE_FILES)
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the answer."""
+    return re.sub(r"\s+", " ", query).strip().strip("?!. ").lower()
+
+
+def make_key(*parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Namespaced key/value cache with TTL, version tags and LRU eviction."""
+
+    def __init__(self, path: Path = CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._writes = 0
+        # last_used of cache hits, written with the next set() or evict() instead of on every read.
+        self._touch_lock = threading.Lock()
+        self._touched: Dict[Tuple[str, str], float] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, namespace: str, outcome: str) -> None:
+        with self._counter_lock:
+            self._counters[namespace][outcome] += 1
+        record_cache(namespace, **{outcome: 1})
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany(
+                "UPDATE cache_entries SET last_used = ? WHERE namespace = ? AND key = ?",
+                [(used, namespace, key) for (namespace, key), used in touched.items()],
+            )
+
+    def get(self, namespace: str, key: str, version: Optional[str] = None) -> Optional[Any]:
+        """Return the cached value, or None when missing, expired or built from older data.
+
+        Reads never write: stale rows are replaced by the next set() or dropped by evict().
+        """
+        row = self._conn().execute(
+            "SELECT value, version, expires FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        now = time.time()
+        if row is None or (row[2] is not None and row[2] < now) or row[1] != version:
+            self._count(namespace, "misses")
+            return None
+        with self._touch_lock:
+            self._touched[(namespace, key)] = now
+        self._count(namespace, "hits")
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, version: Optional[str] = None,
+            ttl: Optional[float] = None) -> None:
+        """Store a value; ttl=None keeps it until evicted, ttl <= 0 means do not cache at all."""
+        if ttl is not None and ttl <= 0:
+            return
+        now = time.time()
+        conn = self._conn()
+        self._flush_touched(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, version, expires, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, default=str), version, now + ttl if ttl is not None else None, now),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        conn = self._conn()
+        self._flush_touched(conn)
+        removed = conn.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires < ?",
+                               (time.time(),)).rowcount
+        overflow = conn.execute("SELECT count(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM cache_entries WHERE rowid IN "
+                "(SELECT rowid FROM cache_entries ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        if namespace is None:
+            self._conn().execute("DELETE FROM cache_entries")
+        else:
+            self._conn().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._counter_lock:
+            result = {}
+            for namespace, counts in self._counters.items():
+                total = counts["hits"] + counts["misses"]
+                result[namespace] = dict(counts, hit_rate=round(counts["hits"] / total, 3) if total else 0.0)
+            return result
+
+
+result_cache = ResultCache()
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return result_cache.stats()
+
+
+def cached_node(
+    namespace: str,
+    fields: Iterable[str],
+    version: Optional[Callable[[], str]] = None,
+    ttl: Optional[float] = None,
+    cacheable: Callable[[Dict[str, Any]], bool] = lambda update: True,
+):
+    """Cache a node's state update keyed by the state fields it reads; works for sync and async nodes."""
+    fields = tuple(fields)
+
+    def key_for(state) -> str:
+        return make_key(*[normalize_query(state[f]) if f == "input" else state.get(f) for f in fields])
+
+    def decorate(node):
+        if not CACHE_ENABLED:
+            return node
+
+        if inspect.iscoroutinefunction(node):
+            @functools.wraps(node)
+            async def async_wrapper(state):
+                key, tag = key_for(state), version() if version else None
+                hit = result_cache.get(namespace, key, tag)
+                if hit is not None:
+                    return hit
+                update = await node(state)
+                if cacheable(update):
+                    result_cache.set(namespace, key, update, tag, ttl)
+                return update
+            return async_wrapper
+
+        @functools.wraps(node)
+        def wrapper(state):
+            key, tag = key_for(state), version() if version else None
+            hit = result_cache.get(namespace, key, tag)
+            if hit is not None:
+                return hit
+            update = node(state)
+            if cacheable(update):
+                result_cache.set(namespace, key, update, tag, ttl)
+            return update
+        return wrapper
+
+    return decorate
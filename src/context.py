@@ -0,0 +1,130 @@
+# Token-budgeted prompt context: estimate, deduplicate and truncate facts in priority order.
+import math
+import os
+import re
+from typing import Iterable, List, NamedTuple, Sequence, Set, Union
+
+from src.telemetry import metrics, span
+
+# Per-prompt budgets for the assembled context, in estimated tokens.
+COMPILER_CONTEXT_TOKENS = int(os.getenv("COMPILER_CONTEXT_TOKENS", "1500"))
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1200"))
+
+# A fact is a duplicate when this share of its words already appeared in a kept fact.
+DUPLICATE_OVERLAP = 0.8
+# Facts shorter than this many words are only dropped when repeated exactly.
+MIN_OVERLAP_WORDS = 4
+# A truncated fact must still carry at least this many tokens to be worth keeping.
+MIN_PARTIAL_TOKENS = 12
+
+TRUNCATION_MARK = " ..."
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Facts are lines, or sentences within a line.
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+Facts = Union[str, Sequence[str]]
+
+
+class ContextSection(NamedTuple):
+    label: str
+    facts: Facts
+    # False for structured records (one part per fact): similar names are still distinct parts,
+    # so these facts are only dropped when repeated exactly. Later sections still match against them.
+    fuzzy: bool = True
+
+
+class AssembledContext(NamedTuple):
+    text: str
+    tokens: int
+    budget: int
+    duplicates: int
+    # Labels of the sections that lost facts to the budget.
+    truncated: List[str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate subword token count: punctuation is one token, words one per four characters."""
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PIECE_PATTERN.findall(text or ""))
+
+
+def split_facts(text: str) -> List[str]:
+    facts = []
+    for line in str(text or "").splitlines():
+        facts.extend(part.strip() for part in SENTENCE_SPLIT_PATTERN.split(line) if part.strip())
+    return facts
+
+
+def _words(text: str) -> Set[str]:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+def _is_duplicate(words: Set[str], normalized: str, seen_exact: Set[str], seen_words: List[Set[str]],
+                  fuzzy: bool = True) -> bool:
+    if normalized in seen_exact:
+        return True
+    if not fuzzy or len(words) < MIN_OVERLAP_WORDS:
+        return False
+    return any(len(words & kept) >= DUPLICATE_OVERLAP * len(words) for kept in seen_words)
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut text at a word boundary so it fits in about `tokens` tokens."""
+    kept, used = [], estimate_tokens(TRUNCATION_MARK)
+    for word in text.split():
+        cost = estimate_tokens(word)
+        if used + cost > tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept) + TRUNCATION_MARK
+
+
+def assemble_context(sections: Iterable[ContextSection], budget: int, name: str = "prompt",
+                     separator: str = "\n") -> AssembledContext:
+    """Join sections in priority order (most important first) within a token budget.
+
+    Repeated facts are dropped (only exact repeats in sections with fuzzy=False); once the
+    budget runs out the remaining lower-priority facts are cut, the first of them possibly
+    shortened to fill the budget.
+    """
+    with span("context", name) as attributes:
+        blocks, used, duplicates, truncated = [], 0, 0, []
+        seen_exact: Set[str] = set()
+        seen_words: List[Set[str]] = []
+        for label, facts, fuzzy in sections:
+            kept = []
+            fact_list = split_facts(facts) if isinstance(facts, str) else [f for f in facts if f and str(f).strip()]
+            header = f"{label}:" if label else ""
+            header_cost = estimate_tokens(header)
+            for fact in fact_list:
+                fact = str(fact).strip()
+                words = _words(fact)
+                normalized = " ".join(sorted(words)) or fact
+                if _is_duplicate(words, normalized, seen_exact, seen_words, fuzzy):
+                    duplicates += 1
+                    continue
+                cost = estimate_tokens(fact) + (header_cost if not kept else 0)
+                if used + cost > budget:
+                    remaining = budget - used - (header_cost if not kept else 0)
+                    if remaining >= MIN_PARTIAL_TOKENS:
+                        fact = _truncate(fact, remaining)
+                        kept.append(fact)
+                        used = budget
+                    if label not in truncated:
+                        truncated.append(label)
+                    break
+                kept.append(fact)
+                used += cost
+                seen_exact.add(normalized)
+                seen_words.append(words)
+            if kept:
+                blocks.append("\n".join(([header] if header else []) + kept))
+        text = separator.join(blocks)
+        tokens = estimate_tokens(text)
+        attributes.update(tokens=tokens, budget=budget, duplicates=duplicates, truncated=truncated)
+
+    metrics.observe("prompt_tokens_estimated", tokens, prompt=name)
+    print(f"--- CONTEXT {name}: ~{tokens}/{budget} tokens, {duplicates} duplicate facts dropped"
+          + (f", truncated: {', '.join(truncated)}" if truncated else "") + " ---")
+    return AssembledContext(text, tokens, budget, duplicates, truncated)
@@ -0,0 +1,66 @@
+# Wiring for the local stand-ins: fake LLM, fixture web search and hash embeddings.
+# Shared by benchmark.py and server.py; kept free of heavy imports so it can run before src is loaded.
+import csv
+import os
+import random
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PARTS_CSV = PROJECT_ROOT / "data" / "exports" / "spare_parts.csv"
+
+VENDORS = ("autozone.com", "rockauto.com", "amazon.com", "ebay.com", "partsgeek.com")
+FAKE_ANSWERS = [
+    "We have this part in stock at a competitive price; it fits the listed vehicles.",
+    "The part is available and priced below the market median.",
+]
+
+
+def configure_environment(with_caches: bool) -> None:
+    """Settings that must be in place before src modules are imported."""
+    if not with_caches:
+        # Every query should exercise the full path, not the result caches.
+        os.environ.setdefault("AGENT_CACHE", "0")
+        os.environ.setdefault("WEB_CACHE_TTL", "0")
+        os.environ.setdefault("EMBEDDING_CACHE", "0")
+    # Provider quotas are not what is being measured; the concurrency cap still applies.
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("LLM_BURST", "1000")
+    os.environ.setdefault("AGENT_TRACE", "0")
+
+
+def load_parts(path: Path = PARTS_CSV) -> List[Dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def search_fixtures(parts: List[Dict[str, str]], seed: int) -> Dict[str, List[Dict[str, str]]]:
+    """Three priced offers per part, keyed by the part name."""
+    rng = random.Random(seed)
+    fixtures: Dict[str, List[Dict[str, str]]] = {"*": []}
+    for part in parts:
+        price = float(part["price"] or 0) or 50.0
+        fixtures[part["name"].lower()] = [
+            {
+                "title": f"{part['name']} - {vendor}",
+                "snippet": f"Buy for ${price * rng.uniform(0.8, 1.25):.2f}. "
+                           + rng.choice(["In stock, ships today.", "Out of stock.", "Free shipping."]),
+                "link": f"https://www.{vendor}/p/{part['part_number'].lower()}",
+            }
+            for vendor in rng.sample(VENDORS, 3)
+        ]
+    return fixtures
+
+
+def install_fakes(parts: List[Dict[str, str]], llm_latency: float = 0.05, search_latency: float = 0.05,
+                  embedding_latency: float = 0.0, seed: int = 7, model_embeddings: bool = False) -> None:
+    """Point the LLM factory, web search and query embeddings at the stand-ins."""
+    from src.fakes import FakeEmbeddings, fake_llm_factory, sql_agent_tool_script
+    from src.llm import set_llm_factory
+    from src.tools.rag_tool import retrieval_service
+    from src.tools.search_tool import FixtureSearchBackend, set_search_backend
+
+    set_llm_factory(fake_llm_factory(llm_latency, FAKE_ANSWERS, sql_agent_tool_script))
+    set_search_backend(FixtureSearchBackend(fixtures=search_fixtures(parts, seed), latency=search_latency))
+    if not model_embeddings:
+        retrieval_service.set_embeddings(FakeEmbeddings(latency=embedding_latency))
@@ -0,0 +1,223 @@
+# Local stand-ins for external services, used to exercise the graph without network access.
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Decides the reply when tools are bound: (messages, tools, tool_choice) -> message, or None for the default.
+ToolScript = Callable[[List[BaseMessage], List[Dict[str, Any]], Any], Optional[AIMessage]]
+
+PLACEHOLDER_VALUES = {"string": "", "number": 0.0, "integer": 0, "boolean": False, "array": [], "object": {}}
+
+
+class FakeRateLimitError(Exception):
+    """Mimics a provider 429 response."""
+
+    code = 429
+
+
+def tool_call(name: str, args: Dict[str, Any]) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+
+
+def placeholder_args(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments that satisfy a tool's JSON schema, used when a tool call is forced."""
+    properties = tool["function"].get("parameters", {}).get("properties", {})
+    return {
+        name: spec["default"] if "default" in spec else PLACEHOLDER_VALUES.get(spec.get("type"), "")
+        for name, spec in properties.items()
+    }
+
+
+def _forced_tool(tools: List[Dict[str, Any]], tool_choice: Any) -> Optional[Dict[str, Any]]:
+    if not tool_choice or tool_choice in ("auto", "none"):
+        return None
+    if isinstance(tool_choice, dict):
+        wanted = tool_choice.get("function", {}).get("name") or tool_choice.get("name")
+    else:
+        wanted = tool_choice if tool_choice not in ("any", "required", True) else None
+    return next((tool for tool in tools if wanted in (None, tool["function"]["name"])), None)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers from a list of canned responses after a fixed latency.
+
+    With tools bound it follows `tool_script`; a forced tool call (as used by
+    with_structured_output) otherwise gets schema-valid placeholder arguments.
+    """
+
+    responses: List[str] = ["This is a canned answer from the local fake model."]
+    latency: float = 0.0
+    # Number of initial calls that fail with a simulated 429.
+    fail_first: int = 0
+    calls: int = 0
+    tool_script: Optional[ToolScript] = None
+
+    _cycle: Any = None
+    _lock: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self._cycle = itertools.cycle(self.responses)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Any = None, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice)
+
+    def _reply(self, messages: List[BaseMessage], text: str, tools: Optional[List[Dict[str, Any]]],
+               tool_choice: Any) -> AIMessage:
+        if tools:
+            if self.tool_script is not None:
+                message = self.tool_script(messages, tools, tool_choice)
+                if message is not None:
+                    return message
+            forced = _forced_tool(tools, tool_choice)
+            if forced is not None:
+                return tool_call(forced["function"]["name"], placeholder_args(forced))
+        return AIMessage(content=text)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            text = next(self._cycle)
+        if self.latency:
+            time.sleep(self.latency)
+        if call <= self.fail_first:
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED (simulated)")
+        message = self._reply(messages, text, kwargs.get("tools"), kwargs.get("tool_choice"))
+        # Rough usage figures (about four characters per token), so token accounting can be exercised.
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = (len(str(message.content)) + len(str(message.tool_calls))) // 4
+        message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                                  "total_tokens": prompt_tokens + completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # Plain-text replies are streamed word by word, so token streaming can be exercised offline.
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._generate(messages, stop=stop, **kwargs).generations[0].message
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=message.content, usage_metadata=message.usage_metadata,
+                tool_call_chunks=[{"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                                  for i, c in enumerate(message.tool_calls)],
+            ))
+            return
+        words = re.findall(r"\S+\s*", str(message.content)) or [""]
+        for i, word in enumerate(words):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=word, usage_metadata=message.usage_metadata if i == len(words) - 1 else None,
+            ))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+def fake_llm_factory(latency: float = 0.0, responses: Optional[List[str]] = None,
+                     tool_script: Optional[ToolScript] = None):
+    """Factory for src.llm.set_llm_factory that returns fake models."""
+    def factory(model: str, temperature: Optional[float]) -> BaseChatModel:
+        kwargs = {"latency": latency, "tool_script": tool_script}
+        if responses:
+            kwargs["responses"] = responses
+        return FakeChatModel(**kwargs)
+    return factory
+
+
+SQL_STOPWORDS = {
+    "the", "and", "for", "you", "have", "any", "need", "what", "how", "much", "does", "with",
+    "price", "stock", "available", "your", "can", "get", "part", "parts", "something", "problems",
+}
+RECORD_PATTERN = re.compile(r"\('([^']*)', '([^']*)', ([\d.]+|None), '([^']*)', '([^']*)'\)")
+
+
+def _question(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in messages if isinstance(m, HumanMessage)), "")
+
+
+def sql_agent_tool_script(messages: List[BaseMessage], tools: List[Dict[str, Any]], tool_choice: Any) -> Optional[AIMessage]:
+    """Plays the SQL agent the way Gemini does: list tables and read schemas (when those tools
+    are offered and the schema is not already in the prompt), query, then answer.
+
+    A forced PartList call is filled from every row of the query result (PartDetails from the first).
+    """
+    names = {tool["function"]["name"] for tool in tools}
+    if "sql_db_query" in names:
+        steps = sum(1 for m in messages if isinstance(m, ToolMessage))
+        if steps == 0 and "sql_db_list_tables" in names:
+            return tool_call("sql_db_list_tables", {"tool_input": ""})
+        if "sql_db_schema" in names and not any(
+                isinstance(m, ToolMessage) and "CREATE TABLE" in str(m.content) for m in messages):
+            return tool_call("sql_db_schema", {"table_names": "spare_parts, inventory"})
+        if not any(isinstance(m, AIMessage) and any(c["name"] == "sql_db_query" for c in m.tool_calls)
+                   for m in messages):
+            words = [w for w in re.findall(r"[a-z0-9]+", _question(messages).lower())
+                     if len(w) > 2 and w not in SQL_STOPWORDS][:4] or ["%"]
+            where = " OR ".join(f"name LIKE '%{w}%'" for w in words)
+            return tool_call("sql_db_query", {"query": (
+                "SELECT part_number, name, price, availability, compatible_models "
+                f"FROM spare_parts WHERE {where} LIMIT 5"
+            )})
+        last = next((str(m.content) for m in reversed(messages) if isinstance(m, ToolMessage)), "")
+        return AIMessage(content=f"Matching parts: {last}" if RECORD_PATTERN.search(last) else "No matching parts found.")
+
+    forced = _forced_tool(tools, tool_choice)
+    if forced is not None and forced["function"]["name"] in ("PartDetails", "PartList"):
+        records = {}
+        for part_number, name, price, status, models in RECORD_PATTERN.findall(" ".join(str(m.content) for m in messages)):
+            records.setdefault(part_number, {
+                "part_number": part_number, "name": name, "price": float(price) if price != "None" else 0.0,
+                "status": status, "compatibility": [m.strip() for m in models.split(",") if m.strip()],
+            })
+        if forced["function"]["name"] == "PartList":
+            return tool_call("PartList", {"parts": list(records.values())})
+        if records:
+            return tool_call("PartDetails", next(iter(records.values())))
+    return None
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-seeded unit vectors; same text, same vector."""
+
+    def __init__(self, dimension: int = 384, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+        vector = np.random.default_rng(seed).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -1,37 +1,257 @@
-from langgraph.graph import END, StateGraph
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Iterator, NamedTuple, Optional
 
-from src.nodes.compiler import compiler_node
-from src.nodes.db_specialist import db_specialist_node
-from src.nodes.rag_expert import rag_expert_node
-from src.nodes.web_researcher import web_researcher_node
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
+
+from src.cache import (
+    CACHE_ENABLED, WEB_TTL_SECONDS, cached_node, db_version, make_key, normalize_query, rag_version, result_cache,
+)
+from src.nodes.compiler import acompiler_node, compiler_node
+from src.nodes.db_specialist import NO_PARTS_FOUND, adb_specialist_node, db_specialist_node
+from src.nodes.rag_expert import arag_expert_node, rag_expert_node
+from src.nodes.router import ALL_BRANCHES, arouter_node, router_node, selected_branches
+from src.nodes.web_researcher import aweb_researcher_node, aweb_search_node, web_researcher_node, web_search_node
 from src.state import AgentState
+from src.telemetry import instrument, record_error, trace_run
+from src.tools.search_tool import SEARCH_FAILED_MESSAGE
+
+
+# Node whose LLM tokens stream_graph forwards as they are generated.
+STREAMED_NODE = "compiler_agent"
+
+# Per-branch time limits in seconds, overridable through the environment.
+BRANCH_TIMEOUTS = {
+    "db_agent": float(os.getenv("DB_AGENT_TIMEOUT", "60")),
+    "rag_agent": float(os.getenv("RAG_AGENT_TIMEOUT", "45")),
+    "web_search": float(os.getenv("WEB_SEARCH_TIMEOUT", "15")),
+    "web_agent": float(os.getenv("WEB_AGENT_TIMEOUT", "30")),
+}
+
+# State updates used when a branch does not finish in time.
+BRANCH_FALLBACKS = {
+    "db_agent": {"db_results": [], "db_error": "the database lookup timed out", "db_lookup_path": "timeout"},
+    "rag_agent": {"rag_results": "No technical documentation could be retrieved in time."},
+    "web_search": {"web_search_results": {"offers": [], "market": {"offers_found": 0}, "error": SEARCH_FAILED_MESSAGE}},
+    "web_agent": {"web_results": {"comparison": "No external market data found to compare."}},
+}
+
+# Per-node result caches keyed by the state fields each node reads. DB and RAG entries are
+# tied to the data files. Web search keeps its own short-lived cache in search_tool.
+NODE_CACHES = {
+    "db_agent": cached_node(
+        "db_agent", ["input", "found_parts"], version=db_version,
+        cacheable=lambda update: update.get("db_error") in ("", NO_PARTS_FOUND),
+    ),
+    "rag_agent": cached_node("rag_agent", ["input", "found_parts"], version=rag_version),
+    "compiler_agent": cached_node("compiler_agent", ["input", "db_results", "rag_results", "web_results"]),
+}
+
+# Synchronous graph runs expected in flight at once; callers running more (batch_run, the
+# benchmark) resize the branch pool with configure_branch_pool.
+GRAPH_CONCURRENT_RUNS = int(os.getenv("GRAPH_CONCURRENT_RUNS", "4"))
+
+
+def _new_branch_pool(concurrent_runs: int) -> ThreadPoolExecutor:
+    # One thread per timed branch of every run, so a branch never queues behind another run's.
+    return ThreadPoolExecutor(max_workers=len(BRANCH_TIMEOUTS) * max(1, concurrent_runs),
+                              thread_name_prefix="graph-branch")
+
+
+_branch_pool = _new_branch_pool(GRAPH_CONCURRENT_RUNS)
+
+
+def configure_branch_pool(concurrent_runs: int) -> None:
+    """Size the branch pool for this many synchronous graph runs in flight at once."""
+    global _branch_pool
+    previous, _branch_pool = _branch_pool, _new_branch_pool(concurrent_runs)
+    # Branches already submitted still finish on the old pool.
+    previous.shutdown(wait=False)
+
+
+# Run a node with a deadline; on timeout the branch contributes its fallback instead.
+def with_timeout(
+    name: str, node: Callable[[AgentState], Dict[str, Any]], seconds: float, fallback: Dict[str, Any]
+) -> Callable[[AgentState], Dict[str, Any]]:
+    def timed_node(state: AgentState) -> Dict[str, Any]:
+        # Copy the context so callbacks and tracing keep working in the worker thread.
+        ctx = contextvars.copy_context()
+        started = threading.Event()
+        start = {}
+
+        def run() -> Dict[str, Any]:
+            start["at"] = time.monotonic()
+            started.set()
+            return ctx.run(node, state)
+
+        future = _branch_pool.submit(run)
+        # The deadline counts from when a worker picks the node up, not from the time spent
+        # queued; a node still queued after `seconds` is cancelled before it starts.
+        if not started.wait(timeout=seconds) and future.cancel():
+            print(f"--- {name} did not start within {seconds:g}s, continuing without it ---")
+            record_error("node", name, "timeout")
+            return dict(fallback, timed_out=[name])
+        started.wait()
+        try:
+            return future.result(timeout=max(0.0, start["at"] + seconds - time.monotonic()))
+        except FutureTimeoutError:
+            # A running worker thread cannot be interrupted; its late result is discarded.
+            future.cancel()
+            print(f"--- {name} exceeded {seconds:g}s, continuing without it ---")
+            record_error("node", name, "timeout")
+            return dict(fallback, timed_out=[name])
+
+    timed_node.__name__ = getattr(node, "__name__", name)
+    return timed_node
+
+
+# Async counterpart of with_timeout; the coroutine is cancelled when it overruns.
+def with_async_timeout(
+    name: str, node: Callable[[AgentState], Awaitable[Dict[str, Any]]], seconds: float, fallback: Dict[str, Any]
+) -> Callable[[AgentState], Awaitable[Dict[str, Any]]]:
+    async def timed_node(state: AgentState) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(node(state), timeout=seconds)
+        except asyncio.TimeoutError:
+            print(f"--- {name} exceeded {seconds:g}s, continuing without it ---")
+            record_error("node", name, "timeout")
+            return dict(fallback, timed_out=[name])
 
+    timed_node.__name__ = getattr(node, "__name__", name)
+    return timed_node
 
-# Define the linear agent workflow.
+
+# A node usable from both app.invoke and app.ainvoke, each path with its own timeout.
+# Every node is cached (if configured) and recorded as a "node" span, timeouts included.
+def _branch(name: str, node, anode) -> RunnableLambda:
+    cache = NODE_CACHES.get(name, lambda node: node)
+    node, anode = cache(node), cache(anode)
+    if name in BRANCH_TIMEOUTS:
+        seconds, fallback = BRANCH_TIMEOUTS[name], BRANCH_FALLBACKS[name]
+        node = with_timeout(name, node, seconds, fallback)
+        anode = with_async_timeout(name, anode, seconds, fallback)
+    return RunnableLambda(instrument("node", name)(node), afunc=instrument("node", name)(anode), name=name)
+
+
+# Route first, fan out to the branches the query needs, then join before the compiler.
 workflow = StateGraph(AgentState)
 
-workflow.add_node("db_agent", db_specialist_node)
-workflow.add_node("rag_agent", rag_expert_node)
-workflow.add_node("web_agent", web_researcher_node)
-workflow.add_node("compiler_agent", compiler_node)
+workflow.add_node("router", _branch("router", router_node, arouter_node))
+workflow.add_node("db_agent", _branch("db_agent", db_specialist_node, adb_specialist_node))
+workflow.add_node("rag_agent", _branch("rag_agent", rag_expert_node, arag_expert_node))
+workflow.add_node("web_search", _branch("web_search", web_search_node, aweb_search_node))
+workflow.add_node("web_agent", _branch("web_agent", web_researcher_node, aweb_researcher_node))
+# Deferred: it runs once, after whichever branches were started have all finished.
+workflow.add_node("compiler_agent", _branch("compiler_agent", compiler_node, acompiler_node), defer=True)
 
-workflow.set_entry_point("db_agent")
-workflow.add_edge("db_agent", "rag_agent")
-workflow.add_edge("rag_agent", "web_agent")
+workflow.add_edge(START, "router")
+workflow.add_conditional_edges("router", selected_branches, ALL_BRANCHES)
+# The market comparison needs both our own offer and the search snippets.
+workflow.add_edge(["db_agent", "web_search"], "web_agent")
+workflow.add_edge("db_agent", "compiler_agent")
+workflow.add_edge("rag_agent", "compiler_agent")
 workflow.add_edge("web_agent", "compiler_agent")
 workflow.add_edge("compiler_agent", END)
 
 app = workflow.compile()
 
 
-# Execute the compiled workflow for a single query.
-def run_graph(query: str) -> AgentState:
-    state: AgentState = {
-        "query": query,
+def initial_state(query: str) -> AgentState:
+    return {
+        "input": query,
+        "route": [],
+        "route_reason": "",
         "db_results": [],
+        "db_error": "",
+        "db_lookup_path": "",
         "found_parts": [],
         "rag_results": [],
-        "web_results": [],
+        "web_search_results": {},
+        "web_results": {},
         "final_answer": "",
+        "timed_out": [],
     }
-    return app.invoke(state)
+
+
+# Whole answers depend on the inventory, the catalogs and (short-lived) market data.
+def _answer_cache_key(query: str):
+    return make_key(normalize_query(query)), f"{db_version()};{rag_version()}"
+
+
+def _remember_answer(key: str, version: str, result: AgentState) -> None:
+    # Answers assembled from timeout fallbacks are not worth keeping.
+    if CACHE_ENABLED and not result.get("timed_out"):
+        result_cache.set("answer", key, dict(result), version, ttl=WEB_TTL_SECONDS)
+
+
+# Execute the compiled workflow for a single query.
+def run_graph(query: str) -> AgentState:
+    key, version = _answer_cache_key(query)
+    with trace_run(query) as run:
+        cached = result_cache.get("answer", key, version) if CACHE_ENABLED else None
+        if cached is not None:
+            return cached
+        result = app.invoke(initial_state(query))
+        run.attributes.update(route=result.get("route"), db_lookup_path=result.get("db_lookup_path"),
+                              timed_out=result.get("timed_out", []))
+    _remember_answer(key, version, result)
+    return result
+
+
+# Async variant: nodes await the shared LLM client instead of blocking threads.
+async def arun_graph(query: str) -> AgentState:
+    key, version = _answer_cache_key(query)
+    with trace_run(query) as run:
+        cached = result_cache.get("answer", key, version) if CACHE_ENABLED else None
+        if cached is not None:
+            return cached
+        result = await app.ainvoke(initial_state(query))
+        run.attributes.update(route=result.get("route"), db_lookup_path=result.get("db_lookup_path"),
+                              timed_out=result.get("timed_out", []))
+    _remember_answer(key, version, result)
+    return result
+
+
+class GraphEvent(NamedTuple):
+    # "node" (a node finished), "token" (compiler output) or "done" (final state in data).
+    kind: str
+    node: str
+    data: Any
+    # Since the query started, and for "node" events how long the node itself ran.
+    elapsed_ms: float
+    duration_ms: Optional[float] = None
+
+
+# Stream one query: each node's update as soon as it finishes, then the compiler's answer
+# token by token, then the final state. Cached and traced like run_graph.
+def stream_graph(query: str) -> Iterator[GraphEvent]:
+    key, version = _answer_cache_key(query)
+    started = time.perf_counter()
+    elapsed = lambda: round((time.perf_counter() - started) * 1000, 1)
+    with trace_run(query) as run:
+        cached = result_cache.get("answer", key, version) if CACHE_ENABLED else None
+        if cached is not None:
+            yield GraphEvent("done", "answer_cache", cached, elapsed())
+            return
+        result = initial_state(query)
+        for mode, payload in app.stream(result, stream_mode=["updates", "messages", "values"]):
+            if mode == "values":
+                result = payload
+            elif mode == "messages":
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") == STREAMED_NODE and chunk.text:
+                    yield GraphEvent("token", STREAMED_NODE, chunk.text, elapsed())
+            else:
+                for node, update in payload.items():
+                    span = run.last_span("node", node)
+                    yield GraphEvent("node", node, update or {}, elapsed(), span and span["duration_ms"])
+        run.attributes.update(route=result.get("route"), db_lookup_path=result.get("db_lookup_path"),
+                              timed_out=result.get("timed_out", []))
+    _remember_answer(key, version, result)
+    yield GraphEvent("done", END, result, elapsed())
@@ -0,0 +1,325 @@
+# Shared chat model layer: one rate limiter, concurrency cap and retry policy for every LLM call.
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from src.telemetry import metrics, record_llm_call
+
+# Limits shared by all nodes and all concurrent requests in this process.
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+BURST = int(os.getenv("LLM_BURST", "10"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "ServerError",
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers sleep (or await) until a token is available."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Take a token if one is available, otherwise return how long to wait for it.
+    def _try_take(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while (wait := self._try_take()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        while (wait := self._try_take()) > 0:
+            await asyncio.sleep(wait)
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight calls across threads and event loops."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def _try_enter(self) -> bool:
+        with self._condition:
+            if self._active < self.limit:
+                self._active += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    async def aacquire(self) -> None:
+        # asyncio primitives are bound to one loop, so poll the shared counter instead.
+        delay = 0.005
+        while not self._try_enter():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+
+rate_limiter = TokenBucket(REQUESTS_PER_MINUTE / 60.0, BURST)
+concurrency_limiter = ConcurrencyLimiter(MAX_CONCURRENCY)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate-limit (429) and server-side (5xx) errors are worth retrying."""
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if callable(value):
+            try:
+                value = value()
+            except Exception:
+                value = None
+        if isinstance(value, int) and value in RETRYABLE_STATUS_CODES:
+            return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "503" in message
+
+
+# Prompt and completion tokens reported by the provider, if any.
+def token_usage(messages: Sequence[BaseMessage]) -> tuple:
+    prompt = completion = 0
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None) or {}
+        prompt += usage.get("input_tokens", 0)
+        completion += usage.get("output_tokens", 0)
+    return prompt, completion
+
+
+# Full-jitter exponential backoff.
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class _Attempt:
+    """One round trip to the provider: its telemetry and, if it fails, whether to retry."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started = time.perf_counter()
+        self.messages: List[BaseMessage] = []
+
+    def produced(self, messages: Iterable[BaseMessage]) -> None:
+        self.messages.extend(messages)
+
+    def succeeded(self) -> None:
+        record_llm_call(self.model, time.perf_counter() - self.started, *token_usage(self.messages))
+
+    def failed(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None when the error is final."""
+        record_llm_call(self.model, time.perf_counter() - self.started, *token_usage(self.messages), error=error)
+        # Output already passed on cannot be taken back, so a stream is only retried before its first chunk.
+        if self.messages or attempt == MAX_RETRIES or not is_retryable(error):
+            return None
+        metrics.increment("llm_retries", model=self.model)
+        delay = backoff_delay(attempt)
+        print(f"--- LLM {self.model} error ({type(error).__name__}), retrying in {delay:.1f}s ---")
+        return delay
+
+
+def _governed(model: str, request: Callable[[], Iterable[Any]],
+              messages_of: Callable[[Any], List[BaseMessage]]) -> Iterator[Any]:
+    """Run a provider request under the shared rate limit, concurrency cap and retry policy.
+
+    `request` returns what the provider produces (one result, or stream chunks); it is
+    yielded item by item. The async paths use _agoverned, which waits instead of blocking.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        concurrency_limiter.acquire()
+        current = _Attempt(model)
+        try:
+            for item in request():
+                current.produced(messages_of(item))
+                yield item
+            current.succeeded()
+            return
+        except Exception as e:
+            delay = current.failed(e, attempt)
+            if delay is None:
+                raise
+        finally:
+            concurrency_limiter.release()
+        time.sleep(delay)
+
+
+async def _agoverned(model: str, request: Callable[[], AsyncIterator[Any]],
+                     messages_of: Callable[[Any], List[BaseMessage]]) -> AsyncIterator[Any]:
+    for attempt in range(MAX_RETRIES + 1):
+        await rate_limiter.aacquire()
+        await concurrency_limiter.aacquire()
+        current = _Attempt(model)
+        try:
+            async for item in request():
+                current.produced(messages_of(item))
+                yield item
+            current.succeeded()
+            return
+        except Exception as e:
+            delay = current.failed(e, attempt)
+            if delay is None:
+                raise
+        finally:
+            concurrency_limiter.release()
+        await asyncio.sleep(delay)
+
+
+def _result_messages(result: ChatResult) -> List[BaseMessage]:
+    return [generation.message for generation in result.generations]
+
+
+def _chunk_messages(chunk: ChatGenerationChunk) -> List[BaseMessage]:
+    return [chunk.message]
+
+
+class GovernedChatModel(BaseChatModel):
+    """Wraps a chat model so every call goes through the shared limiter, retry and metrics."""
+
+    inner: BaseChatModel
+    model_name: str
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"governed-{self.inner._llm_type}"
+
+    # Stream only when the wrapped model can.
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs: Any) -> bool:
+        return self.inner._should_stream(async_api=async_api, run_manager=run_manager, **kwargs)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # Let the provider format the tools, then bind them to this wrapper instead.
+        bound = self.inner.bind_tools(tools, **kwargs)
+        return self.bind(**bound.kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        (result,) = _governed(
+            self.model_name,
+            lambda: [self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)],
+            _result_messages,
+        )
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async def request():
+            yield await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        # Drain the generator so the attempt is recorded and the concurrency slot released.
+        (result,) = [result async for result in _agoverned(self.model_name, request, _result_messages)]
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        yield from _governed(
+            self.model_name,
+            lambda: self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _chunk_messages,
+        )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in _agoverned(
+            self.model_name,
+            lambda: self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            _chunk_messages,
+        ):
+            yield chunk
+
+
+# Build the provider model; retries are handled by GovernedChatModel instead of the SDK.
+def _gemini_factory(model: str, temperature: Optional[float]) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from src.resources import load_environment
+
+    load_environment()
+    kwargs = {"model": model, "google_api_key": os.getenv("GOOGLE_API_KEY"), "max_retries": 1}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+_factory: Callable[[str, Optional[float]], BaseChatModel] = _gemini_factory
+_clients: Dict[tuple, GovernedChatModel] = {}
+_clients_lock = threading.Lock()
+
+
+def set_llm_factory(factory: Callable[[str, Optional[float]], BaseChatModel]) -> None:
+    """Swap the provider (e.g. for a local fake model) and drop cached clients."""
+    global _factory
+    with _clients_lock:
+        _factory = factory
+        _clients.clear()
+
+
+def get_llm(model: str, temperature: Optional[float] = None) -> GovernedChatModel:
+    """Return the shared client for a model, creating it on first use."""
+    key = (model, temperature)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = GovernedChatModel(inner=_factory(model, temperature), model_name=model)
+                _clients[key] = client
+    return client
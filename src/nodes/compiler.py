@@ -1,42 +1,43 @@
+from src.context import COMPILER_CONTEXT_TOKENS, ContextSection, assemble_context
 from src.state import AgentState
-from src.state import AgentState
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.llm import get_llm
+from src.nodes.db_specialist import part_facts
+from src.nodes.web_researcher import market_facts
+
+
 # LLM used to rewrite the final answer into a natural response.
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash",google_api_key=GOOGLE_API_KEY)
+MODEL = "gemini-2.5-flash"
+
 
-def compiler_node(state: AgentState) -> AgentState:
+def build_compiler_prompt(state: AgentState) -> str:
     base_answer = state.get("final_answer", "").strip()
     if not base_answer:
-        lines = [
-            f"Query: {state['input']}",
-            f"DB results: {state['db_results']}",
-            f"RAG results: {state['rag_results']}",
-            f"Web results: {state['web_results']}",
-        ]
-        base_answer = "\n".join(lines)
+        # Structured DB facts first, then the market comparison, then catalog text; branches
+        # the router skipped leave their results empty and are left out.
+        context = assemble_context([
+            ContextSection("DB results", part_facts(state.get("db_results"), state.get("db_error", "")), fuzzy=False),
+            ContextSection("Web results", market_facts(state.get("web_results") or {})),
+            ContextSection("RAG results", str(state.get("rag_results") or "")),
+        ], COMPILER_CONTEXT_TOKENS, name="compiler")
+        base_answer = f"Query: {state['input']}\n{context.text}"
 
     # Ask the LLM to rewrite the summary into a clear, user-friendly response.
-    prompt = (
+    return (
         "You are a helpful assistant. Rewrite the input into a natural, concise response "
         "that explains the process and summarizes the results for the user.\n\n"
         f"Input:\n{base_answer}\n\n"
         "Response:"
     )
 
-    response = llm.invoke(prompt)
-    state["final_answer"] = response.content.strip()
-    return state
+
+def compiler_node(state: AgentState):
+    response = get_llm(MODEL).invoke(build_compiler_prompt(state))
+    return {"final_answer": response.content.strip()}
+
+
+async def acompiler_node(state: AgentState):
+    response = await get_llm(MODEL).ainvoke(build_compiler_prompt(state))
+    return {"final_answer": response.content.strip()}
 
 
 run = compiler_node
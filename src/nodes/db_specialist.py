@@ -1,93 +1,172 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.agent_toolkits import create_sql_agent
-from src.state import AgentState
-from src.tools.sql_tool import get_sql_toolkit
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-
-from pydantic import BaseModel, Field
-from typing import Optional
-
-class PartDetails(BaseModel):
-    part_number: str = Field(description="The unique identifier for the spare part")
-    name: str = Field(description="The formal name of the part")
-    price: float = Field(description="The internal retail price")
-    status: str = Field(description="Availability: in_stock, out_of_stock, or low_stock")
-    compatibility: list[str] = Field(description="List of compatible car models")
-
-load_dotenv()
-import os
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash",google_api_key=GOOGLE_API_KEY)
-structured_llm = llm.with_structured_output(PartDetails)
+import asyncio
 
-def db_specialist_node(state: AgentState):
-    print("--- EJECUTANDO AGENTE SQL (DB SPECIALIST) ---")
-    query = state["input"]
-    
-    toolkit = get_sql_toolkit(llm)
+from src.llm import get_llm
+from src.state import AgentState, PartDetails, PartList
+from src.telemetry import span
+from src.tools.parts_index import lookup_parts, split_part_mentions
+from src.tools.sql_tool import get_sql_toolkit, schema_context
 
-    # Instruction prompt for the SQL agent.
-    SQL_AGENT_PROMPT = """You are an agent designed to interact with a SQL database.
-        Given an input question, identify the product or products that match the query 
-        and create a syntactically correct sqlite query to run,
-        then look at the results of the query and return the answer. Unless the user
-        specifies a specific number of examples they wish to obtain, always limit your
-        query to at most 5 results.
 
-        You need to always include price, part number and availability information.
+MODEL = "gemini-2.5-flash"
 
-        give the answer in a plain text format, and do not include any markdown or code formatting in your answer.
+# db_error when the lookup worked but nothing matched; unlike real errors this is worth caching.
+NO_PARTS_FOUND = "no matching parts found"
 
-        DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the database.
-        If no data is found, explain which tables you consulted and why no results were returned.
-        """
-    
-    # Agent executor
-    executor = create_sql_agent(
+# Instruction prompt for the SQL agent.
+SQL_AGENT_PROMPT = """You are an agent designed to interact with a SQL database.
+    Given an input question, identify the product or products that match the query 
+    and create a syntactically correct sqlite query to run,
+    then look at the results of the query and return the answer. Unless the user
+    specifies a specific number of examples they wish to obtain, always limit your
+    query to at most 5 results per requested part. If the question lists several parts,
+    find all of them with a single query.
+
+    You need to always include price, part number and availability information.
+
+    give the answer in a plain text format, and do not include any markdown or code formatting in your answer.
+
+    DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the database.
+    If no data is found, explain which tables you consulted and why no results were returned.
+
+    These are the only tables, with a few sample rows each:
+
+    {schema}
+    """
+
+# Replaces the default "look at the tables first" opener; the schema is already in the prompt.
+SQL_AGENT_SUFFIX = "I know the schema of both tables, so I should write the query directly."
+
+
+def _agent_prompt() -> str:
+    # create_sql_agent calls str.format on the prefix, so braces in sample rows are escaped.
+    schema = schema_context().replace("{", "{{").replace("}", "}}")
+    return SQL_AGENT_PROMPT.replace("{schema}", schema)
+
+
+# Render a part the way downstream agents expect to read it.
+def format_part_details(part: PartDetails) -> str:
+    return (
+        f"Part Name: {part.name} | "
+        f"ID: {part.part_number} | "
+        f"Price: {part.price} | "
+        f"Status: {part.status} | "
+        f"Compatibility: {', '.join(part.compatibility)}"
+    )
+
+
+def part_facts(db_results, db_error: str = "") -> list:
+    """One line per part found, or the reason none was found."""
+    facts = [format_part_details(PartDetails(**part)) for part in db_results or []]
+    if not facts and db_error:
+        facts.append(f"No structured data found: {db_error}")
+    return facts
+
+
+def _build_executor():
+    # Imported here: the agent toolkit is slow to import and only needed off the fast path.
+    from langchain_community.agent_toolkits import create_sql_agent
+
+    llm = get_llm(MODEL)
+    return create_sql_agent(
         llm=llm,
-        toolkit=toolkit,
+        toolkit=get_sql_toolkit(llm),
         verbose=False,
         agent_type="tool-calling",
-        prefix=SQL_AGENT_PROMPT,
+        prefix=_agent_prompt(),
+        suffix=SQL_AGENT_SUFFIX,
     )
-    
- 
+
+
+# Handle Gemini metadata if present
+def _raw_text(raw_output) -> str:
+    if isinstance(raw_output, list) and len(raw_output) > 0:
+        return raw_output[0].get('text', str(raw_output[0]))
+    return str(raw_output)
+
+
+def _extraction_prompt(raw_text: str) -> str:
+    return f"Extract the details of every part in this database record: {raw_text}"
+
+
+def _mentions(state: AgentState):
+    # The router normally extracts the parts; nodes invoked on their own do it here.
+    return state.get("found_parts") or split_part_mentions(state["input"])
+
+
+def _fast_path(query: str, mentions) -> dict:
+    """Resolve every mentioned part locally; returns the parts found and the mentions still open."""
+    if not mentions:
+        return {"parts": [], "unresolved": []}
+    with span("sql", "fast_path", mentions=len(mentions)) as attributes:
+        matches = lookup_parts(mentions, query)
+        parts = {}
+        for match in matches:
+            for part in match.parts:
+                parts.setdefault(part.part_number, part)
+        unresolved = [match.mention for match in matches if not match.parts]
+        attributes.update(parts=len(parts), unresolved=unresolved)
+    return {"parts": list(parts.values()), "unresolved": unresolved}
+
+
+def _merge(found, extra):
+    """Fast-path parts first, then agent parts that were not already found."""
+    known = {part.part_number for part in found}
+    return found + [part for part in extra if part.part_number not in known]
+
+
+def _result(parts, path: str, error: str = "") -> dict:
+    if not parts and not error:
+        error = NO_PARTS_FOUND
+    return {"db_results": [part.model_dump() for part in parts], "db_error": error, "db_lookup_path": path}
+
+
+def db_specialist_node(state: AgentState):
+    query = state["input"]
+    mentions = _mentions(state)
+
+    fast = _fast_path(query, mentions)
+    if fast["parts"] and not fast["unresolved"]:
+        return _result(fast["parts"], "fast_path")
+
+    # Failures are recorded on the spans; the node still answers with the fast-path parts.
     try:
         # Step A: Get raw info from DB using the agent
-        response = executor.invoke({"input": query})
-        raw_output = response["output"]
-
-        # Handle Gemini metadata if present
-        if isinstance(raw_output, list) and len(raw_output) > 0:
-            raw_text = raw_output[0].get('text', str(raw_output[0]))
-        else:
-            raw_text = str(raw_output)
+        with span("sql", "sql_agent"):
+            response = _build_executor().invoke({"input": query})
+        raw_text = _raw_text(response["output"])
 
         # Step B: Parse the raw DB text into Structured Output (Pydantic)
-        print("--- STRUCTURING OUTPUT WITH PYDANTIC ---")
-        structured_data = structured_llm.invoke(
-            f"Extract part details from this database record: {raw_text}"
-        )
-
-        # Convert Pydantic object to string for the RAG/Web agents or 
-        # store the object itself if your state allows it.
-        formatted_result = (
-            f"Part Name: {structured_data.name} | "
-            f"ID: {structured_data.part_number} | "
-            f"Price: {structured_data.price} | "
-            f"Status: {structured_data.status} | "
-            f"Compatibility: {', '.join(structured_data.compatibility)}"
-        )
-
-        return {"db_results": formatted_result}
+        with span("sql", "structured_output"):
+            structured_llm = get_llm(MODEL).with_structured_output(PartList)
+            structured_data = structured_llm.invoke(_extraction_prompt(raw_text))
+
+        return _result(_merge(fast["parts"], structured_data.parts), "sql_agent")
     
     except Exception as e:
-        print(f"Error: {e}")
-        return {"db_results": f"No structured data found. Error: {str(e)}"}
+        return _result(fast["parts"], "sql_agent", error=str(e))
+
+
+async def adb_specialist_node(state: AgentState):
+    query = state["input"]
+
+    # The first lookup may build the local index, so keep it off the event loop.
+    mentions = state.get("found_parts") or await asyncio.to_thread(split_part_mentions, query)
+    fast = await asyncio.to_thread(_fast_path, query, mentions)
+    if fast["parts"] and not fast["unresolved"]:
+        return _result(fast["parts"], "fast_path")
+
+    try:
+        with span("sql", "sql_agent"):
+            response = await _build_executor().ainvoke({"input": query})
+        raw_text = _raw_text(response["output"])
+
+        with span("sql", "structured_output"):
+            structured_llm = get_llm(MODEL).with_structured_output(PartList)
+            structured_data = await structured_llm.ainvoke(_extraction_prompt(raw_text))
+
+        return _result(_merge(fast["parts"], structured_data.parts), "sql_agent")
+
+    except Exception as e:
+        return _result(fast["parts"], "sql_agent", error=str(e))
     
-run = db_specialist_node
\ No newline at end of file
+run = db_specialist_node
@@ -1,28 +1,34 @@
-from src.state import AgentState
-from langchain_google_genai import ChatGoogleGenerativeAI
-from src.tools.rag_tool import search_documents
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+import asyncio
 
-load_dotenv()
-import os
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+from src.state import AgentState
+from src.llm import get_llm
 
 
 # LLM used to synthesize answers from retrieved documents.
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash",google_api_key=GOOGLE_API_KEY)
+MODEL = "gemini-2.5-flash"
 
 
-def rag_expert_node(state: AgentState) -> AgentState:
+def rag_expert_node(state: AgentState):
     """RAG expert node: search vectorstore for relevant documents."""
+    # FAISS and the retrieval stack are imported on the first RAG query, not with the graph.
+    from src.tools.rag_tool import search_documents
+
+    query = state["input"]
+    print("--- EJECUTANDO AGENTE RAG (RAG EXPERT) ---")
+    rag_results = search_documents(llm=get_llm(MODEL), found_parts=state.get("found_parts"))
+    # Only return the keys this node owns so it can run alongside the other branches.
+    return {"rag_results": rag_results.invoke(query)}
+
+
+async def arag_expert_node(state: AgentState):
+    """Async RAG expert node."""
+    from src.tools.rag_tool import search_documents
+
     query = state["input"]
     print("--- EJECUTANDO AGENTE RAG (RAG EXPERT) ---")
-    rag_results = search_documents(llm=llm)
-    state["rag_results"] = rag_results.invoke(query)
-    #print(f"RAG results: {state['rag_results']}")
-    return state
+    # Loading the index can block on disk the first time, so keep it off the event loop.
+    rag_results = await asyncio.to_thread(search_documents, llm=get_llm(MODEL), found_parts=state.get("found_parts"))
+    return {"rag_results": await rag_results.ainvoke(query)}
 
 
 run = rag_expert_node
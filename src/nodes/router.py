@@ -0,0 +1,107 @@
+import asyncio
+import os
+import re
+from typing import List, NamedTuple
+
+from src.state import AgentState
+from src.tools.parts_index import (
+    PART_NUMBER_PATTERN, catalog_terms, part_number_mentions, split_part_mentions, tokenize,
+)
+
+# Set AGENT_ROUTER=0 to send every query through all branches again.
+ROUTER_ENABLED = os.getenv("AGENT_ROUTER", "1") != "0"
+
+# Entry nodes of the three branches; the market comparison needs the DB branch as well.
+DB_BRANCH = "db_agent"
+RAG_BRANCH = "rag_agent"
+WEB_BRANCH = "web_search"
+ALL_BRANCHES = [DB_BRANCH, RAG_BRANCH, WEB_BRANCH]
+
+# Phrases are matched before single words so "how much" is not read as a how-to question.
+COMMERCIAL_PATTERN = re.compile(
+    r"\b(how much|price[sd]?|pricing|costs?|cheap(er|est)?|expensive|buy(ing)?|purchase|order|"
+    r"deals?|discounts?|quotes?|market|compare|competitors?|need|looking for|want)\b"
+)
+INVENTORY_PATTERN = re.compile(
+    r"\b(in stock|stock|availab(le|ility)|do you (have|carry|sell)|part numbers?|sku|"
+    r"fits?|fitment|compatib(le|ility))\b"
+)
+TECHNICAL_PATTERN = re.compile(
+    r"\b(how (do|to|can|often|long)|why|install(ing|ation)?|replace|replacing|torque|specs?|"
+    r"specifications?|symptoms?|noises?|diagnos(e|is)|maintenance|maintain|recommend(ed|ation)?|"
+    r"intervals?|procedure|manual|warning|problems?|issues?|repair|explain|difference|"
+    r"what is|what are|guide|capacity|pressure|lifespan|wear)\b"
+)
+
+
+class Route(NamedTuple):
+    branches: List[str]
+    reason: str
+
+
+def classify_query(query: str) -> Route:
+    """Pick the branches a query needs from keywords, part numbers and catalog vocabulary; no LLM call."""
+    text = " ".join(tokenize(query))
+    commercial = bool(COMMERCIAL_PATTERN.search(text))
+    inventory = bool(INVENTORY_PATTERN.search(text))
+    # Remove commercial phrases first so "how much" does not count as a how-to question.
+    technical = bool(TECHNICAL_PATTERN.search(COMMERCIAL_PATTERN.sub(" ", text)))
+    try:
+        # Vehicle models that look like part numbers ("F-150") are not a part number signal.
+        part_number = bool(part_number_mentions(query))
+        catalog = set(tokenize(query)) & catalog_terms()
+    except Exception as e:
+        print(f"Router catalog vocabulary unavailable: {e}")
+        part_number = bool(PART_NUMBER_PATTERN.search(query))
+        catalog = set()
+
+    signals = [name for name, present in (
+        ("part_number", part_number), ("commercial", commercial), ("inventory", inventory),
+        ("technical", technical), ("catalog_terms", bool(catalog)),
+    ) if present]
+    if not signals:
+        return Route(list(ALL_BRANCHES), "no routing signal")
+
+    branches = []
+    if part_number or commercial or inventory or (catalog and not technical):
+        branches.append(DB_BRANCH)
+    if technical or not branches:
+        branches.append(RAG_BRANCH)
+    if commercial:
+        branches.append(WEB_BRANCH)
+    return Route(branches, ", ".join(signals))
+
+
+def _found_parts(query: str) -> List[str]:
+    try:
+        return split_part_mentions(query)
+    except Exception as e:
+        print(f"Part mention extraction failed: {e}")
+        return []
+
+
+# Routing and part extraction share this first stage; both only read the query.
+def _route_update(query: str) -> dict:
+    found_parts = _found_parts(query)
+    if not ROUTER_ENABLED:
+        return {"route": list(ALL_BRANCHES), "route_reason": "router disabled", "found_parts": found_parts}
+    route = classify_query(query)
+    print(f"--- ROUTER: {', '.join(route.branches)} ({route.reason}); parts: {found_parts} ---")
+    return {"route": route.branches, "route_reason": route.reason, "found_parts": found_parts}
+
+
+def router_node(state: AgentState):
+    return _route_update(state["input"])
+
+
+async def arouter_node(state: AgentState):
+    # The first call may build the parts index, so keep it off the event loop.
+    return await asyncio.to_thread(_route_update, state["input"])
+
+
+# Conditional-edge function: the branch entry nodes chosen by the router.
+def selected_branches(state: AgentState) -> List[str]:
+    return state.get("route") or list(ALL_BRANCHES)
+
+
+run = router_node
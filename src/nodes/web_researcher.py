@@ -1,47 +1,85 @@
+import asyncio
+
 from src.state import AgentState
 from src.tools.search_tool import web_search
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-# 4. Use Gemini to summarize the web findings
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
 
-def web_researcher_node(state: AgentState):
-    
-    search_results = web_search(state["input"])
-    
-    # Prompt the model to compare internal data with web results.
-    web_prompt = f"""
-    
-    ### ROLE
-    You are a Strategic Sales Analyst for a spare parts company. Your goal is to compare our internal offers with the current internet market to highlight our competitive advantages.
-
-    ### DATA
-    INTERNAL DATA: {state['db_results']}
-    INTERNET SEARCH RESULTS: {search_results}
-
-    ### TASK
-    1. Compare our price, part number, and availability with the search results found online.
-    2. Identify at least one reason why the customer should choose us (e.g., our price is lower, we have it in stock while others don't, or our part is a confirmed OEM match).
-    3. Summarize the market context and provide a brief "Value Proposition" explaining our advantage.
-
-    ### RULES
-    - Provide the answer in plain text only.
-    - Absolutely NO markdown, NO bolding (**), and NO symbols.
-    - Be concise (max 4-5 sentences).
-    - If the internet price is lower, focus on our "immediate availability" or "guaranteed compatibility."
-    - If no relevant info is found, simply say: No external market data found to compare.
-    
+# Offers passed on to the compiler; the rest only feed the market statistics.
+MAX_OFFERS_IN_RESULT = 3
+
+
+# Fetch market snippets; only needs the user input, so it starts with the other branches.
+def web_search_node(state: AgentState):
+    return {"web_search_results": web_search(state["input"])}
+
+
+async def aweb_search_node(state: AgentState):
+    # The search client is synchronous, so run it in a worker thread.
+    return {"web_search_results": await asyncio.to_thread(web_search, state["input"])}
+
+
+def compare_with_market(db_results, search_results) -> dict:
+    """Compare our offer with the structured market data, without an LLM call.
+
+    The search covers the whole question, so with several parts the first one is compared.
     """
-    
-    response = llm.invoke(web_prompt)
-    state["web_results"] = response.content
-    return state
+    market = search_results.get("market", {})
+    result = {
+        "market": market,
+        "offers": [
+            {k: offer[k] for k in ("vendor", "price", "currency", "stock")}
+            for offer in search_results.get("offers", [])[:MAX_OFFERS_IN_RESULT]
+        ],
+    }
+    if not market.get("offers_found"):
+        result["comparison"] = "No external market data found to compare."
+        return result
+
+    part = db_results[0] if db_results else {}
+    if not part.get("price"):
+        result["comparison"] = (
+            f"Market prices range from {market['min_price']} to {market['max_price']} {market['currency']}."
+        )
+        return result
+
+    our_price = float(part["price"])
+    median = market["median_price"]
+    result["our_price"] = our_price
+    result["difference_vs_median_pct"] = round((our_price - median) / median * 100, 1) if median else None
+    if our_price <= median:
+        advantage = "our price is at or below the market median"
+    elif part.get("status") == "in_stock":
+        advantage = "the part is in stock for immediate availability with guaranteed compatibility"
+    else:
+        advantage = "the part is a confirmed catalog match with guaranteed compatibility"
+    result["comparison"] = (
+        f"Our price {our_price} vs market median {median} {market['currency']} "
+        f"across {market['offers_found']} online offers; advantage: {advantage}."
+    )
+    return result
+
+
+def market_facts(web_results: dict) -> list:
+    """The comparison, market statistics and top offers as one-line facts, most useful first."""
+    facts = [web_results["comparison"]] if web_results.get("comparison") else []
+    market = web_results.get("market") or {}
+    if market.get("offers_found"):
+        facts.append(
+            f"Market: {market['offers_found']} offers, median {market.get('median_price')}, "
+            f"range {market.get('min_price')}-{market.get('max_price')} {market.get('currency', '')}".strip()
+        )
+    for offer in web_results.get("offers", []):
+        facts.append(f"Offer: {offer.get('vendor')} at {offer.get('price')} {offer.get('currency') or ''}, "
+                     f"stock {offer.get('stock') or 'unknown'}")
+    return facts
+
+
+def web_researcher_node(state: AgentState):
+    search_results = state.get("web_search_results") or web_search(state["input"])
+    return {"web_results": compare_with_market(state["db_results"], search_results)}
+
+
+async def aweb_researcher_node(state: AgentState):
+    search_results = state.get("web_search_results") or await asyncio.to_thread(web_search, state["input"])
+    return {"web_results": compare_with_market(state["db_results"], search_results)}
 
 run = web_researcher_node
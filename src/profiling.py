@@ -0,0 +1,60 @@
+# Import-time profile of the application, shown by `python main.py --profile-startup`.
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import List, NamedTuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# "import time:       341 |       1298 |     src.telemetry" (microseconds, indented by nesting).
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def import_timings(module: str = "src.graph") -> List[ImportTiming]:
+    """Import `module` in a fresh interpreter with -X importtime and parse the report."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_ROOT,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append(ImportTiming(name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent) // 2))
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return timings
+
+
+def print_startup_profile(module: str = "src.graph", top: int = 15) -> None:
+    timings = import_timings(module)
+    total = next((t.cumulative_ms for t in timings if t.module == module), sum(t.self_ms for t in timings))
+    print(f"Importing {module} took {total:.0f} ms across {len(timings)} modules\n")
+
+    # Where the time goes, by top-level package.
+    by_package = defaultdict(lambda: [0.0, 0])
+    for timing in timings:
+        entry = by_package[timing.module.split(".")[0]]
+        entry[0] += timing.self_ms
+        entry[1] += 1
+    print("| package | self ms | modules |")
+    print("| --- | --- | --- |")
+    for package, (self_ms, count) in sorted(by_package.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+        print(f"| {package} | {self_ms:.1f} | {count} |")
+
+    # Our own modules, with everything they pulled in.
+    print("\n| module | cumulative ms | self ms |")
+    print("| --- | --- | --- |")
+    own = [t for t in timings if t.module == "src" or t.module.startswith("src.")]
+    for timing in sorted(own, key=lambda t: t.cumulative_ms, reverse=True)[:top]:
+        print(f"| {timing.module} | {timing.cumulative_ms:.1f} | {timing.self_ms:.1f} |")
@@ -0,0 +1,90 @@
+# Process-wide clients created on first use, so importing the graph does no network, disk or model work.
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# Resolved from the package, so the app works from any working directory.
+DB_PATH = PROJECT_ROOT / "data" / "spare_parts.db"
+ENV_FILE = PROJECT_ROOT / ".env"
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_environment() -> None:
+    """Read .env once per process; variables already set in the environment win."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv(ENV_FILE if ENV_FILE.exists() else None)
+            _env_loaded = True
+
+
+class Resources:
+    """Lazily created shared clients; each one is built at most once, on first use.
+
+    LLM clients are created the same way by src.llm.get_llm, which loads the environment
+    before the first provider client is built.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        # Seconds each resource took to create, for the startup profile.
+        self.timings: Dict[str, float] = {}
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = self._instances[name] = factory()
+                    self.timings[name] = time.perf_counter() - started
+        return instance
+
+    def sql_database(self):
+        """SQLDatabase over a pool of read-only connections to the catalog tables, used by the SQL agent."""
+        from src.tools.sql_tool import open_sql_database
+
+        return self._get("sql_database", lambda: open_sql_database(DB_PATH))
+
+    def retrieval(self):
+        """Embedding model and FAISS index; the service itself loads them on first search."""
+        from src.tools.rag_tool import retrieval_service
+
+        return self._get("retrieval", lambda: retrieval_service)
+
+    def warmup(self, retrieval: bool = True) -> None:
+        """Create everything up front (servers, the Streamlit app) so the first query is fast."""
+        load_environment()
+        self.sql_database()
+        from src.tools.parts_index import catalog_terms
+        from src.tools.sql_tool import schema_context
+
+        schema_context(DB_PATH)
+        # Builds the parts search index if needed and loads the router's vocabulary.
+        catalog_terms(DB_PATH)
+        if retrieval:
+            started = time.perf_counter()
+            self.retrieval().warmup()
+            self.timings["retrieval_warmup"] = time.perf_counter() - started
+
+    def loaded(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.timings)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._instances.clear()
+            self.timings.clear()
+
+
+resources = Resources()
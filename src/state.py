@@ -1,11 +1,38 @@
-from typing import Any, Dict, List, TypedDict
+import operator
+from typing import Annotated, Any, Dict, List, TypedDict
+
+from pydantic import BaseModel, Field
+
+
+# Structured description of a single spare part.
+class PartDetails(BaseModel):
+    part_number: str = Field(description="The unique identifier for the spare part")
+    name: str = Field(description="The formal name of the part")
+    price: float = Field(description="The internal retail price")
+    status: str = Field(description="Availability: in_stock, out_of_stock, or low_stock")
+    compatibility: list[str] = Field(description="List of compatible car models")
+
+
+# Every part found for a question, as returned by the structured SQL agent output.
+class PartList(BaseModel):
+    parts: list[PartDetails] = Field(description="One entry per matching spare part")
 
 
 # Shared state passed between all agent nodes.
 class AgentState(TypedDict):
     input: str
+    # Branch entry nodes picked by the router, and the signals that decided it.
+    route: List[str]
+    route_reason: str
+    # PartDetails dicts, one per part found; db_error explains an empty list.
     db_results: List[Dict[str, Any]]
+    db_error: str
+    db_lookup_path: str
+    # Part mentions extracted from the question, e.g. ["oil filter", "brake pads"].
     found_parts: List[str]
     rag_results: List[Dict[str, Any]]
-    web_results: List[Dict[str, Any]]
+    web_search_results: Dict[str, Any]
+    web_results: Dict[str, Any]
     final_answer: str
+    # Branches that timed out and contributed a fallback; parallel branches append to it.
+    timed_out: Annotated[List[str], operator.add]
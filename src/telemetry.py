@@ -0,0 +1,326 @@
+# Run tracing and metrics: spans for nodes and tool calls, LLM tokens and cost, cache hits and errors.
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TRACE_ENABLED = os.getenv("AGENT_TRACE", "1") != "0"
+TRACE_PATH = Path(os.getenv("AGENT_TRACE_PATH", PROJECT_ROOT / "data" / "traces" / "runs.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("AGENT_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("AGENT_TRACE_BACKUPS", "5"))
+# Percentiles are computed over this many recent observations per series.
+HISTOGRAM_WINDOW = 2048
+
+# USD per million prompt / completion tokens; override or extend with LLM_PRICES='{"model": [in, out]}'.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _series(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Histogram:
+    """Count, sum and max of all observations; percentiles over a recent window."""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.recent)
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(pick(0.50), 3),
+            "p95": round(pick(0.95), 3),
+            "p99": round(pick(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class MetricsRegistry:
+    """In-process counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def increment(self, metric: str, value: float = 1, **labels: str) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, metric: str, value: float, **labels: str) -> None:
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def histogram(self, metric: str, **labels: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            histogram = self._histograms.get((metric, tuple(sorted(labels.items()))))
+            return histogram.summary() if histogram else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                "counters": {_series(name, labels): round(value, 6) for (name, labels), value in sorted(self._counters.items())},
+                "histograms": {_series(name, labels): h.summary() for (name, labels), h in sorted(self._histograms.items())},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+class RunTrace:
+    """Spans and totals of one graph run; shared by the threads and tasks working on it."""
+
+    def __init__(self, query: str):
+        self.run_id = uuid.uuid4().hex[:16]
+        self.query = query
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        # Run-level facts worth keeping in the trace, e.g. which branches timed out.
+        self.attributes: Dict[str, Any] = {}
+        self.totals: Dict[str, float] = {
+            "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            "cache_hits": 0, "cache_misses": 0, "errors": 0,
+        }
+
+    def offset_ms(self, perf_time: float) -> float:
+        return round((perf_time - self._t0) * 1000, 2)
+
+    def add_span(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def last_span(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((s for s in reversed(self.spans) if s["kind"] == kind and s["name"] == name), None)
+
+    def add(self, **amounts: float) -> None:
+        with self._lock:
+            for key, amount in amounts.items():
+                self.totals[key] += amount
+
+    def to_dict(self, status: str, error: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started_at": self.started_at,
+                "query": self.query,
+                "status": status,
+                "error": error,
+                "wall_ms": self.offset_ms(time.perf_counter()),
+                **{k: round(v, 6) if isinstance(v, float) else v for k, v in self.totals.items()},
+                **self.attributes,
+                "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+            }
+
+
+_current_run: contextvars.ContextVar[Optional[RunTrace]] = contextvars.ContextVar("current_run", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_run() -> Optional[RunTrace]:
+    return _current_run.get()
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a block as a `kind`/`name` span; the yielded dict can carry extra attributes."""
+    run = _current_run.get()
+    parent = _current_span.get()
+    token = _current_span.set(f"{kind}:{name}")
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield attributes
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current_span.reset(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.observe("latency_ms", elapsed_ms, kind=kind, name=name)
+        if status != "ok":
+            metrics.increment("errors", kind=kind, name=name)
+        if run is not None:
+            if status != "ok":
+                run.add(errors=1)
+            run.add_span(dict(
+                attributes, kind=kind, name=name, parent=parent, status=status, error=error,
+                start_ms=run.offset_ms(started), duration_ms=round(elapsed_ms, 2),
+            ))
+
+
+def instrument(kind: str, name: Optional[str] = None):
+    """Decorator recording every call of a sync or async function as a span."""
+
+    def decorate(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def record_llm_call(model: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+                    error: Optional[BaseException] = None) -> None:
+    """One LLM round trip (each retry attempt counts separately)."""
+    cost = llm_cost(model, prompt_tokens, completion_tokens)
+    metrics.observe("llm_latency_ms", seconds * 1000, model=model)
+    metrics.increment("llm_calls", model=model)
+    metrics.increment("llm_prompt_tokens", prompt_tokens, model=model)
+    metrics.increment("llm_completion_tokens", completion_tokens, model=model)
+    metrics.increment("llm_cost_usd", cost, model=model)
+    if error is not None:
+        metrics.increment("errors", kind="llm", name=model)
+    run = _current_run.get()
+    if run is not None:
+        run.add(llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                cost_usd=cost, errors=int(error is not None))
+        run.add_span({
+            "kind": "llm", "name": model, "parent": _current_span.get(),
+            "status": "ok" if error is None else "error",
+            "error": None if error is None else f"{type(error).__name__}: {error}"[:300],
+            "start_ms": run.offset_ms(time.perf_counter() - seconds), "duration_ms": round(seconds * 1000, 2),
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": round(cost, 6),
+        })
+
+
+def record_cache(namespace: str, hits: int = 0, misses: int = 0) -> None:
+    if hits:
+        metrics.increment("cache_hits", hits, namespace=namespace)
+    if misses:
+        metrics.increment("cache_misses", misses, namespace=namespace)
+    run = _current_run.get()
+    if run is not None:
+        run.add(cache_hits=hits, cache_misses=misses)
+
+
+def record_error(kind: str, name: str, reason: str) -> None:
+    """An error that was handled (e.g. a timeout replaced by a fallback) but should still be counted."""
+    metrics.increment("errors", kind=kind, name=name, reason=reason)
+    run = _current_run.get()
+    if run is not None:
+        run.add(errors=1)
+
+
+class TraceWriter:
+    """Appends one JSON line per run to a size-rotated file."""
+
+    def __init__(self, path: Path = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._logger: Optional[logging.Logger] = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                                  encoding="utf-8")
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    logger = logging.getLogger(f"agent.trace.{self.path}")
+                    logger.propagate = False
+                    logger.setLevel(logging.INFO)
+                    logger.addHandler(handler)
+                    self._logger = logger
+        return self._logger
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._get_logger().info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+trace_writer = TraceWriter()
+
+
+@contextmanager
+def trace_run(query: str) -> Iterator[RunTrace]:
+    """Collect everything recorded while one query is answered and export it when done."""
+    existing = _current_run.get()
+    if existing is not None:
+        # Nested call (e.g. run_graph inside a traced server request): keep one trace.
+        yield existing
+        return
+    run = RunTrace(query)
+    token = _current_run.set(run)
+    status, error = "ok", None
+    try:
+        yield run
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current_run.reset(token)
+        record = run.to_dict(status, error)
+        metrics.observe("run_latency_ms", record["wall_ms"])
+        metrics.increment("runs", status=status)
+        if TRACE_ENABLED:
+            try:
+                trace_writer.write(record)
+            except OSError as e:
+                print(f"Trace export failed: {e}")
+
+
+def metrics_snapshot() -> Dict[str, Dict[str, Any]]:
+    return metrics.snapshot()
@@ -0,0 +1,193 @@
+# Disk-backed embedding cache: float32 vectors in one memory-mapped file plus a hash index.
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.telemetry import record_cache, span
+
+CACHE_DIR = Path(__file__).resolve().parents[2] / "data" / "cache" / "embeddings"
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+# Misses are embedded in batches of this size.
+BATCH_SIZE = 64
+# SQLite limits the number of bound parameters per statement.
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    row INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+
+class EmbeddingStore:
+    """Append-only vector file for one model; rows are addressed through a SQLite hash index."""
+
+    def __init__(self, model_name: str, cache_dir: Path = CACHE_DIR):
+        self.model_name = model_name
+        self.path = Path(cache_dir) / _slug(model_name)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / "vectors.f32"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._mmap: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+        if row is not None and row[0] != model_name:
+            raise ValueError(f"Embedding cache at {self.path} belongs to {row[0]}, not {model_name}")
+        row = conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self._dim = int(row[0]) if row else None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path / "index.db", timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _rows(self) -> int:
+        if not self._dim or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (4 * self._dim)
+
+    # Map the vector file, remapping when other writers have appended rows.
+    def _vectors(self, needed_row: int) -> np.ndarray:
+        with self._lock:
+            if self._mmap is None or needed_row >= self._mmap.shape[0]:
+                self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                       shape=(self._rows(), self._dim))
+            return self._mmap
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if not self._dim:
+            return {}
+        found: Dict[str, int] = {}
+        conn = self._conn()
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk))
+        if not found:
+            return {}
+        vectors = self._vectors(max(found.values()))
+        return {key: np.array(vectors[row]) for key, row in found.items()}
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        matrix = np.asarray(list(items.values()), dtype=np.float32)
+        conn = self._conn()
+        # The write lock serializes appends across threads and processes.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self._dim),))
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self.model_name,))
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dim vectors, got {matrix.shape[1]}")
+            first_row = self._rows()
+            with open(self.vectors_path, "ab") as f:
+                # Drop a partial row left by an interrupted write before appending.
+                f.truncate(first_row * 4 * self._dim)
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, row) VALUES (?, ?)",
+                [(key, first_row + i) for i, key in enumerate(items)],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def embed_queries_uncached(embeddings: Embeddings) -> Callable[[List[str]], List[List[float]]]:
+    # The catalog model adds no query instruction, so a batch of queries embeds like documents.
+    return getattr(embeddings, "embed_queries", embeddings.embed_documents)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from the disk cache and batches the misses.
+
+    `inner` may be an Embeddings object or a zero-argument factory; a factory is only
+    called on the first cache miss, so fully cached workloads never load the model.
+    """
+
+    def __init__(self, inner: Union[Embeddings, Callable[[], Embeddings]], model_name: str,
+                 cache_dir: Path = CACHE_DIR, batch_size: int = BATCH_SIZE):
+        self._inner = inner if isinstance(inner, Embeddings) else None
+        self._factory = None if isinstance(inner, Embeddings) else inner
+        self._inner_lock = threading.Lock()
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.store = EmbeddingStore(model_name, cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def inner(self) -> Embeddings:
+        if self._inner is None:
+            with self._inner_lock:
+                if self._inner is None:
+                    self._inner = self._factory()
+        return self._inner
+
+    # Queries and documents may be embedded differently, so they never share keys.
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _embed(self, kind: str, texts: List[str], compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        cached = self.store.get_many(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        self.hits += hits
+        self.misses += len(missing)
+        record_cache("embeddings", hits=hits, misses=len(missing))
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[start:start + self.batch_size]
+            with span("embedding", self.model_name, batch=len(batch)):
+                vectors = compute([missing[key] for key in batch])
+            computed = dict(zip(batch, vectors))
+            self.store.put_many(computed)
+            cached.update({key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()})
+        return [cached[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("doc", list(texts), lambda batch: self.inner.embed_documents(batch))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text], lambda batch: [self.inner.embed_query(batch[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one model call, cached like embed_query."""
+        return self._embed("query", list(texts), embed_queries_uncached(self.inner))
+
+
+def cached_embeddings(factory: Callable[[], Embeddings], model_name: str) -> Embeddings:
+    """Wrap an embeddings factory with the disk cache unless EMBEDDING_CACHE=0."""
+    if not CACHE_ENABLED:
+        return factory()
+    return CachedEmbeddings(factory, model_name)
@@ -0,0 +1,199 @@
+# Normalized vehicle fitment (make, model, year range -> part) built from compatible_models.
+import re
+import sqlite3
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+YEAR_PATTERN = re.compile(r"^(19|20)\d{2}$")
+
+# "Toyota Camry 2018-2023", "Ford Focus 2012", "Ram 1500 2013-present".
+FITMENT_PATTERN = re.compile(
+    r"^(?P<vehicle>.+?)\s+(?P<start>(?:19|20)\d{2})(?:\s*-\s*(?P<end>(?:19|20)\d{2}|present))?$",
+    re.IGNORECASE,
+)
+
+# Makes whose names span more than one word.
+MULTI_WORD_MAKES = ("alfa romeo", "aston martin", "land rover", "mercedes benz", "rolls royce")
+
+OPEN_ENDED_YEAR = 9999
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicle_fitment (
+    id        INTEGER PRIMARY KEY,
+    make      TEXT NOT NULL COLLATE NOCASE,
+    model     TEXT NOT NULL COLLATE NOCASE,
+    year_from INTEGER NOT NULL,
+    year_to   INTEGER NOT NULL,
+    source    TEXT NOT NULL,
+    part_id   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fitment_vehicle ON vehicle_fitment (make, model, year_from, year_to);
+CREATE INDEX IF NOT EXISTS idx_fitment_model ON vehicle_fitment (model, year_from, year_to);
+CREATE INDEX IF NOT EXISTS idx_fitment_part ON vehicle_fitment (source, part_id);
+"""
+
+SOURCE_QUERIES = {
+    "spare_parts": "SELECT id, compatible_models FROM spare_parts",
+    "inventory": "SELECT id, compatible_models FROM inventory",
+}
+
+
+class Fitment(NamedTuple):
+    make: str
+    model: str
+    year_from: int
+    year_to: int
+
+
+class Vehicle(NamedTuple):
+    make: Optional[str]
+    model: str
+    year: Optional[int]
+    # Query tokens that described the vehicle, so callers can ignore them.
+    tokens: Tuple[str, ...]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def _split_make_model(vehicle: str) -> Tuple[str, str]:
+    normalized = " ".join(tokenize(vehicle))
+    for make in MULTI_WORD_MAKES:
+        if normalized.startswith(make + " "):
+            words = vehicle.split()
+            make_words = len(make.split())
+            # Hyphenated makes such as "Mercedes-Benz" are a single word in the source text.
+            if "-" in words[0]:
+                make_words = 1
+            return " ".join(words[:make_words]), " ".join(words[make_words:])
+    make, _, model = vehicle.partition(" ")
+    return make, model
+
+
+def parse_compatible_models(text: Optional[str]) -> List[Fitment]:
+    """Parse a free-text compatible_models value into fitment rows."""
+    fitments = []
+    for entry in (text or "").split(","):
+        match = FITMENT_PATTERN.match(entry.strip())
+        if not match:
+            continue
+        make, model = _split_make_model(match.group("vehicle").strip())
+        if not model:
+            continue
+        start = int(match.group("start"))
+        end = match.group("end")
+        if end is None:
+            year_to = start
+        elif end.lower() == "present":
+            year_to = OPEN_ENDED_YEAR
+        else:
+            year_to = int(end)
+        fitments.append(Fitment(make, model, start, year_to))
+    return fitments
+
+
+def _insert_fitments(conn: sqlite3.Connection, source: str, rows: Iterable[Tuple[int, str]]) -> int:
+    count = 0
+    for part_id, compatible_models in rows:
+        fitments = parse_compatible_models(compatible_models)
+        conn.executemany(
+            "INSERT INTO vehicle_fitment (make, model, year_from, year_to, source, part_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(f.make, f.model, f.year_from, f.year_to, source, part_id) for f in fitments],
+        )
+        count += len(fitments)
+    return count
+
+
+def build_fitment_index(conn: sqlite3.Connection) -> int:
+    """(Re)build vehicle_fitment from spare_parts and inventory. Runs inside the caller's transaction."""
+    create_fitment_schema(conn)
+    conn.execute("DELETE FROM vehicle_fitment")
+    count = 0
+    for source, sql in SOURCE_QUERIES.items():
+        count += _insert_fitments(conn, source, conn.execute(sql).fetchall())
+    return count
+
+
+def refresh_fitment(conn: sqlite3.Connection, source: str, part_ids: Iterable[int]) -> int:
+    """Re-derive the fitment rows of the given parts; ids that no longer exist are only removed."""
+    part_ids = list(part_ids)
+    if not part_ids:
+        return 0
+    placeholders = ", ".join("?" * len(part_ids))
+    conn.execute(f"DELETE FROM vehicle_fitment WHERE source = ? AND part_id IN ({placeholders})",
+                 [source, *part_ids])
+    return _insert_fitments(conn, source, conn.execute(
+        f"{SOURCE_QUERIES[source]} WHERE id IN ({placeholders})", part_ids
+    ).fetchall())
+
+
+# executescript() would commit an open transaction, so run the statements one by one.
+def create_fitment_schema(conn: sqlite3.Connection) -> None:
+    for statement in SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def parts_for_vehicle(
+    conn: sqlite3.Connection, model: str, year: Optional[int] = None, make: Optional[str] = None
+) -> List[Tuple[str, int]]:
+    """Return (source, part_id) pairs that fit the vehicle, using an indexed interval lookup."""
+    sql = "SELECT DISTINCT source, part_id FROM vehicle_fitment WHERE model = ?"
+    params: list = [model]
+    if make:
+        sql = "SELECT DISTINCT source, part_id FROM vehicle_fitment WHERE make = ? AND model = ?"
+        params = [make, model]
+    if year is not None:
+        sql += " AND year_from <= ? AND year_to >= ?"
+        params += [year, year]
+    return [(source, part_id) for source, part_id in conn.execute(sql, params)]
+
+
+def vehicle_vocabulary(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+    return [(make, model) for make, model in conn.execute(
+        "SELECT DISTINCT make, model FROM vehicle_fitment"
+    )]
+
+
+def _find_sequence(tokens: List[str], sequence: List[str]) -> int:
+    for start in range(len(tokens) - len(sequence) + 1):
+        if tokens[start:start + len(sequence)] == sequence:
+            return start
+    return -1
+
+
+def parse_vehicle(query: str, vocabulary: Iterable[Tuple[str, str]]) -> Optional[Vehicle]:
+    """Find a known make/model and an optional model year mentioned in the query."""
+    tokens = tokenize(query)
+    best = None
+    for make, model in vocabulary:
+        model_tokens = tokenize(model)
+        make_tokens = tokenize(make)
+        position = _find_sequence(tokens, model_tokens)
+        if position < 0 and len(model_tokens) > 1:
+            # Written as one word: "F150" for "F-150".
+            model_tokens = ["".join(model_tokens)]
+            position = _find_sequence(tokens, model_tokens)
+        if position < 0:
+            continue
+        has_make = tokens[max(0, position - len(make_tokens)):position] == make_tokens
+        # Short or numeric model names ("3", "6") are only trusted right after their make.
+        if not has_make and (len(model) <= 2 or model.replace(" ", "").isdigit()):
+            continue
+        used = model_tokens + (make_tokens if has_make else [])
+        score = (has_make, len(used))
+        if best is None or score > best[0]:
+            best = (score, make if has_make else None, model, used)
+    if best is None:
+        return None
+
+    _, make, model, used = best
+    year = None
+    for token in tokens:
+        if YEAR_PATTERN.match(token):
+            year = int(token)
+            used = used + [token]
+            break
+    return Vehicle(make, model, year, tuple(used))
@@ -0,0 +1,209 @@
+# Local BM25 index over the vectorstore chunks, fused with FAISS by reciprocal rank.
+import hashlib
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+
+from src.telemetry import span
+from src.tools.embedding_cache import embed_queries_uncached
+
+LEXICAL_INDEX_NAME = "lexical.pkl"
+
+# Retrieval settings, overridable through the environment.
+TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+DENSE_WEIGHT = float(os.getenv("RAG_DENSE_WEIGHT", "1.0"))
+LEXICAL_WEIGHT = float(os.getenv("RAG_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Hyphenated codes such as "alt-130a" are kept whole and also split into their parts.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+
+def corpus_signature(doc_ids: Iterable[str]) -> str:
+    """Identifies the set of chunks an index was built from."""
+    digest = hashlib.sha256()
+    for doc_id in sorted(doc_ids):
+        digest.update(doc_id.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.avg_length = 0.0
+        self.signature = ""
+
+    @classmethod
+    def build(cls, docs: Dict[str, str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        postings = defaultdict(list)
+        for position, (doc_id, text) in enumerate(docs.items()):
+            tokens = tokenize(text)
+            index.doc_ids.append(doc_id)
+            index.doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings[term].append((position, count))
+        index.postings = dict(postings)
+        index.avg_length = sum(index.doc_lengths) / len(index.doc_lengths) if docs else 0.0
+        index.signature = corpus_signature(index.doc_ids)
+        return index
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        total = len(self.doc_ids)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings:
+                norm = 1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1)
+                scores[position] += idf * count * (self.k1 + 1) / (count + self.k1 * norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[position], score) for position, score in best]
+
+    def save(self, path: Path) -> None:
+        tmp_path = Path(str(path) + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: Path) -> Optional["BM25Index"]:
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+
+def docstore_texts(vectorstore) -> Dict[str, str]:
+    """Chunk texts keyed by docstore id, in FAISS index order."""
+    if hasattr(vectorstore.docstore, "texts"):
+        # The on-disk docstore streams them in one query.
+        return dict(vectorstore.docstore.texts())
+    texts = {}
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(doc_id)
+        if isinstance(doc, LCDocument):
+            texts[doc_id] = doc.page_content
+    return texts
+
+
+def build_lexical_index(vectorstore, vectorstore_path: Path) -> BM25Index:
+    """Build the BM25 index from the vectorstore's chunks and persist it next to the FAISS files."""
+    index = BM25Index.build(docstore_texts(vectorstore))
+    index.save(Path(vectorstore_path) / LEXICAL_INDEX_NAME)
+    return index
+
+
+def load_lexical_index(vectorstore, vectorstore_path: Path) -> BM25Index:
+    """Load the persisted BM25 index, rebuilding it if it was built from other chunks."""
+    index = BM25Index.load(Path(vectorstore_path) / LEXICAL_INDEX_NAME)
+    if index is None or index.signature != corpus_signature(vectorstore.index_to_docstore_id.values()):
+        print("--- BUILDING LEXICAL (BM25) INDEX ---")
+        index = build_lexical_index(vectorstore, vectorstore_path)
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[Tuple[List[str], float]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists; each ranking contributes weight / (k + rank)."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ids, weight in rankings:
+        for rank, doc_id in enumerate(ids, start=1):
+            scores[doc_id] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS and BM25 retrieval combined with weighted reciprocal-rank fusion."""
+
+    vectorstore: object
+    lexical_index: object
+    k: int = TOP_K
+    fetch_k: int = FETCH_K
+    dense_weight: float = DENSE_WEIGHT
+    lexical_weight: float = LEXICAL_WEIGHT
+    rrf_k: int = RRF_K
+
+    def _fuse(self, dense_ids: List[str], lexical_hits: List[Tuple[str, float]],
+              known: Dict[str, LCDocument]) -> List[LCDocument]:
+        fused = reciprocal_rank_fusion(
+            [
+                (dense_ids, self.dense_weight),
+                ([doc_id for doc_id, _ in lexical_hits], self.lexical_weight),
+            ],
+            k=self.rrf_k,
+        )
+        results = []
+        for doc_id, _ in fused[:self.k]:
+            doc = known.get(doc_id) or self.vectorstore.docstore.search(doc_id)
+            if isinstance(doc, LCDocument):
+                results.append(doc)
+        return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: Optional[CallbackManagerForRetrieverRun] = None
+    ) -> List[LCDocument]:
+        dense_docs, lexical_hits = [], []
+        if self.dense_weight:
+            with span("embedding", "embed_query"):
+                vector = self.vectorstore.embedding_function.embed_query(query)
+            with span("faiss", "similarity_search"):
+                dense_docs = self.vectorstore.similarity_search_by_vector(vector, k=self.fetch_k)
+        if self.lexical_weight:
+            with span("bm25", "search"):
+                lexical_hits = self.lexical_index.search(query, k=self.fetch_k)
+        return self._fuse([doc.id for doc in dense_docs], lexical_hits, {doc.id: doc for doc in dense_docs})
+
+    def retrieve_many(self, queries: List[str]) -> List[List[LCDocument]]:
+        """Results for several queries, with one embedding call and one FAISS search for all of them."""
+        dense_ids: List[List[str]] = [[] for _ in queries]
+        if self.dense_weight and queries:
+            embeddings = self.vectorstore.embedding_function
+            embed = getattr(embeddings, "embed_queries", None) or embed_queries_uncached(embeddings)
+            with span("embedding", "embed_queries", batch=len(queries)):
+                vectors = np.asarray(embed(list(queries)), dtype=np.float32)
+            if getattr(self.vectorstore, "_normalize_L2", False):
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            with span("faiss", "search_batch", batch=len(queries)):
+                _, positions = self.vectorstore.index.search(vectors, self.fetch_k)
+            mapping = self.vectorstore.index_to_docstore_id
+            found = [int(p) for row in positions for p in row if p != -1]
+            ids = mapping.ids_for(found) if hasattr(mapping, "ids_for") else {p: mapping[p] for p in found}
+            dense_ids = [[ids[int(p)] for p in row if int(p) in ids] for row in positions]
+        results = []
+        for query, ranked in zip(queries, dense_ids):
+            lexical_hits = []
+            if self.lexical_weight:
+                with span("bm25", "search"):
+                    lexical_hits = self.lexical_index.search(query, k=self.fetch_k)
+            results.append(self._fuse(ranked, lexical_hits, {}))
+        return results
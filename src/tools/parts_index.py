@@ -0,0 +1,578 @@
+# Local full-text index over the parts tables for LLM-free lookups.
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from src.resources import DB_PATH
+from src.state import PartDetails
+from src.telemetry import instrument
+from src.tools.fitment import (
+    YEAR_PATTERN, Vehicle, build_fitment_index, parse_vehicle, parts_for_vehicle, refresh_fitment, vehicle_vocabulary,
+)
+
+# Part numbers look like "OF-001", "ALT-130A" or "rad001".
+PART_NUMBER_PATTERN = re.compile(r"\b([A-Za-z]{1,5})-?(\d{2,5}[A-Za-z]?)\b")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no information about which part is wanted.
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "available", "buy", "can", "cost", "do", "does",
+    "for", "get", "have", "how", "i", "in", "is", "it", "looking", "me", "much", "my",
+    "need", "of", "on", "please", "price", "stock", "the", "to", "want", "what",
+    "with", "you", "your",
+}
+
+# A name match is confident when this share of the part name appears in the query.
+NAME_COVERAGE_THRESHOLD = 0.75
+# An ambiguous mention ("brake pads") returns at most this many candidates that match it fully.
+MAX_CANDIDATES_PER_MENTION = 3
+
+# Separators between the parts listed in one question.
+MENTION_SEPARATOR_PATTERN = re.compile(r"\s*(?:[,;&/+]|\band\b|\bplus\b|\bas well as\b|\balso\b)\s*")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5(
+    part_number, name, description, source UNINDEXED, source_id UNINDEXED
+);
+CREATE TABLE IF NOT EXISTS parts_index_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS parts_index_rows (
+    source TEXT NOT NULL,
+    id     INTEGER NOT NULL,
+    digest INTEGER NOT NULL,
+    PRIMARY KEY (source, id)
+) WITHOUT ROWID;
+"""
+
+# Both tables feed the index; inventory has no description column.
+SOURCE_QUERIES = {
+    "spare_parts": "SELECT id, part_number, name, description FROM spare_parts",
+    "inventory": "SELECT id, part_number, name, '' FROM inventory",
+}
+# What the search and fitment indexes are built from.
+FINGERPRINT_QUERIES = {
+    "spare_parts": "SELECT id, part_number, name, description, compatible_models FROM spare_parts",
+    "inventory": "SELECT id, part_number, name, compatible_models FROM inventory",
+}
+FINGERPRINT_BATCH_ROWS = 5000
+DIGEST_MODULUS = 2 ** 64
+# Columns whose changes require re-indexing a row.
+INDEXED_COLUMNS = ("part_number", "name", "description")
+
+# Bumped when the layout of the index tables changes, so existing indexes are rebuilt once.
+INDEX_FORMAT = "3"
+
+
+# Parts found for one mention of a multi-part query; several when the mention is ambiguous.
+class PartMatch(NamedTuple):
+    mention: str
+    parts: List[PartDetails]
+    match_type: str
+
+
+_index_lock = threading.Lock()
+_checked_signature = {}
+_vocabulary_cache = {}
+_terms_cache = {}
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text the same way the FTS5 unicode61 tokenizer does."""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def _content_tokens(text: str) -> List[str]:
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+# 64-bit digest of one source row, stored as a signed SQLite integer.
+def _row_digest(row) -> int:
+    digest = hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _source_digests(conn: sqlite3.Connection, source: str, ids: Optional[List[int]] = None) -> Iterable[tuple]:
+    """(id, digest) of every row of a source table, or of the given ids only."""
+    sql, params = FINGERPRINT_QUERIES[source], []
+    if ids is not None:
+        sql += f" WHERE id IN ({', '.join('?' * len(ids))})"
+        params = ids
+    cursor = conn.execute(sql, params)
+    while rows := cursor.fetchmany(FINGERPRINT_BATCH_ROWS):
+        for row in rows:
+            yield row[0], _row_digest(row)
+
+
+# The fingerprint is the row count and the sum of the row digests of each table, so it can be
+# updated from the rows a change touched instead of re-hashing the tables.
+def _format_fingerprint(checksums: Dict[str, Tuple[int, int]]) -> str:
+    tables = [f"{table}:{count}:{total:x}" for table, (count, total) in checksums.items()]
+    return "|".join([f"v{INDEX_FORMAT}", *tables])
+
+
+def _parse_fingerprint(fingerprint: str) -> Dict[str, Tuple[int, int]]:
+    checksums = {}
+    for part in fingerprint.split("|")[1:]:
+        table, count, total = part.split(":")
+        checksums[table] = (int(count), int(total, 16))
+    return checksums
+
+
+# Checksum of every source column the indexes are built from; a difference means the index is stale.
+def _source_fingerprint(conn: sqlite3.Connection) -> str:
+    checksums = {}
+    for source in FINGERPRINT_QUERIES:
+        count = total = 0
+        for _, digest in _source_digests(conn, source):
+            count, total = count + 1, (total + digest) % DIGEST_MODULUS
+        checksums[source] = (count, total)
+    return _format_fingerprint(checksums)
+
+
+# FTS rowids are derived from the source row, so one row can be re-indexed without a table scan.
+def _fts_rowid(source: str, source_id: int) -> int:
+    return source_id * len(SOURCE_QUERIES) + list(SOURCE_QUERIES).index(source)
+
+
+def _insert_fts_rows(conn: sqlite3.Connection, source: str, rows: Iterable[tuple]) -> int:
+    entries = [
+        (_fts_rowid(source, row_id), part_number, name, description or "", source, row_id)
+        for row_id, part_number, name, description in rows
+    ]
+    conn.executemany(
+        "INSERT INTO parts_fts (rowid, part_number, name, description, source, source_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        entries,
+    )
+    return len(entries)
+
+
+def _record_fingerprint(conn: sqlite3.Connection, fingerprint: str) -> None:
+    conn.execute("INSERT OR REPLACE INTO parts_index_meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+
+
+def _store_digests(conn: sqlite3.Connection, source: str, digests: Iterable[tuple]) -> Tuple[int, int]:
+    """Save row digests for a later refresh; returns (rows, digest sum) of what was saved."""
+    count = total = 0
+    batch = []
+    for row_id, digest in digests:
+        batch.append((source, row_id, digest))
+        count, total = count + 1, (total + digest) % DIGEST_MODULUS
+    conn.executemany("INSERT INTO parts_index_rows (source, id, digest) VALUES (?, ?, ?)", batch)
+    return count, total
+
+
+def _stored_fingerprint(conn: sqlite3.Connection) -> Optional[str]:
+    try:
+        row = conn.execute("SELECT value FROM parts_index_meta WHERE key = 'fingerprint'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def build_parts_index(conn: sqlite3.Connection) -> int:
+    """(Re)build the full-text and vehicle fitment indexes from spare_parts and inventory."""
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.execute("DELETE FROM parts_fts")
+        rows = 0
+        for source, sql in SOURCE_QUERIES.items():
+            rows += _insert_fts_rows(conn, source, conn.execute(sql).fetchall())
+        build_fitment_index(conn)
+        conn.execute("DELETE FROM parts_index_rows")
+        checksums = {source: _store_digests(conn, source, _source_digests(conn, source))
+                     for source in FINGERPRINT_QUERIES}
+        _record_fingerprint(conn, _format_fingerprint(checksums))
+    return rows
+
+
+def parts_index_current(conn: sqlite3.Connection) -> bool:
+    """True when the search index matches the source tables, so it can be updated row by row."""
+    return _stored_fingerprint(conn) == _source_fingerprint(conn)
+
+
+def refresh_parts_index(conn: sqlite3.Connection, source: str, search_ids: Iterable[int],
+                        fitment_ids: Iterable[int] = ()) -> None:
+    """Re-index changed rows of one source table inside the caller's transaction.
+
+    Ids that no longer exist are only removed. Only call this on an index that was current
+    before the change (parts_index_current); it then records the index as current again,
+    from the digests of the touched rows alone.
+    """
+    search_ids = list(search_ids)
+    fitment_ids = list(fitment_ids)
+    if search_ids:
+        conn.executemany("DELETE FROM parts_fts WHERE rowid = ?",
+                         [(_fts_rowid(source, row_id),) for row_id in search_ids])
+        placeholders = ", ".join("?" * len(search_ids))
+        _insert_fts_rows(conn, source, conn.execute(
+            f"{SOURCE_QUERIES[source]} WHERE id IN ({placeholders})", search_ids
+        ).fetchall())
+    refresh_fitment(conn, source, fitment_ids)
+
+    touched = sorted(set(search_ids) | set(fitment_ids))
+    if not touched:
+        return
+    placeholders = ", ".join("?" * len(touched))
+    checksums = _parse_fingerprint(_stored_fingerprint(conn))
+    count, total = checksums[source]
+    for (digest,) in conn.execute(
+        f"SELECT digest FROM parts_index_rows WHERE source = ? AND id IN ({placeholders})", [source, *touched]
+    ):
+        count, total = count - 1, (total - digest) % DIGEST_MODULUS
+    conn.execute(f"DELETE FROM parts_index_rows WHERE source = ? AND id IN ({placeholders})", [source, *touched])
+    added, added_total = _store_digests(conn, source, _source_digests(conn, source, touched))
+    checksums[source] = (count + added, (total + added_total) % DIGEST_MODULUS)
+    _record_fingerprint(conn, _format_fingerprint(checksums))
+
+
+def index_path(db_path: Path = DB_PATH) -> Path:
+    """The derived search tables live in their own file next to the catalog, never in the catalog."""
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}.index.db")
+
+
+def connect_index(db_path: Path = DB_PATH, index_mode: str = "ro", catalog_mode: str = "ro",
+                  timeout: float = 5.0) -> sqlite3.Connection:
+    """The index database with the catalog ATTACHed as `catalog`.
+
+    The index has no spare_parts or inventory tables of its own, so those names resolve to the
+    catalog. Modes are SQLite URI modes: "ro", "rw" or "rwc" (create the file if missing).
+    """
+    conn = sqlite3.connect(f"file:{index_path(db_path).as_posix()}?mode={index_mode}", uri=True, timeout=timeout)
+    conn.execute("ATTACH DATABASE ? AS catalog", (f"file:{Path(db_path).as_posix()}?mode={catalog_mode}",))
+    return conn
+
+
+def _file_signature(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _signature(db_path: Path):
+    return (_file_signature(db_path), _file_signature(index_path(db_path)))
+
+
+def ensure_parts_index(db_path: Path = DB_PATH) -> None:
+    """Build the index if it is missing or out of date; checked again only when either file changes.
+
+    Only the index file is written; the catalog is attached read-only.
+    """
+    db_path = Path(db_path)
+    signature = _signature(db_path)
+    if _checked_signature.get(db_path) == signature:
+        return
+    with _index_lock:
+        if _checked_signature.get(db_path) == signature:
+            return
+        conn = connect_index(db_path, index_mode="rwc")
+        try:
+            if not parts_index_current(conn):
+                print("--- BUILDING PARTS SEARCH INDEX ---")
+                build_parts_index(conn)
+        finally:
+            conn.close()
+        # Building the index touches its file, so record the signature afterwards.
+        _checked_signature[db_path] = _signature(db_path)
+
+
+def _connect_readonly(db_path: Path) -> sqlite3.Connection:
+    conn = connect_index(db_path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# Map an inventory stock count onto the status vocabulary used by spare_parts.
+def _stock_status(stock: Optional[int]) -> str:
+    if not stock:
+        return "out_of_stock"
+    return "low_stock" if stock <= 5 else "in_stock"
+
+
+# Columns needed to build a PartDetails; inventory reports a stock count instead of a status.
+PART_QUERIES = {
+    "spare_parts": "SELECT id, part_number, name, price, availability AS status, compatible_models FROM spare_parts",
+    "inventory": "SELECT id, part_number, name, price, stock, compatible_models FROM inventory",
+}
+
+
+def _row_to_part(source: str, row: sqlite3.Row) -> PartDetails:
+    status = row["status"] if source == "spare_parts" else _stock_status(row["stock"])
+    return PartDetails(
+        part_number=row["part_number"],
+        name=row["name"],
+        price=row["price"] or 0.0,
+        status=status or "unknown",
+        compatibility=[m.strip() for m in (row["compatible_models"] or "").split(",") if m.strip()],
+    )
+
+
+def _load_parts(conn: sqlite3.Connection, refs: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], PartDetails]:
+    """Load many (source, id) rows with one query per source table."""
+    ids_by_source: Dict[str, List[int]] = {}
+    for source, source_id in refs:
+        ids_by_source.setdefault(source, []).append(source_id)
+    parts = {}
+    for source, ids in ids_by_source.items():
+        placeholders = ", ".join("?" * len(ids))
+        for row in conn.execute(f"{PART_QUERIES[source]} WHERE id IN ({placeholders})", ids):
+            parts[(source, row["id"])] = _row_to_part(source, row)
+    return parts
+
+
+def _vocabulary(conn: sqlite3.Connection, db_path: Path) -> List[Tuple[str, str]]:
+    # The make/model vocabulary only changes with the database file.
+    signature = _checked_signature.get(Path(db_path))
+    cached = _vocabulary_cache.get(Path(db_path))
+    if cached is None or cached[0] != signature:
+        cached = (signature, vehicle_vocabulary(conn))
+        _vocabulary_cache[Path(db_path)] = cached
+    return cached[1]
+
+
+def _vehicle_in_query(conn: sqlite3.Connection, db_path: Path, query: str) -> Optional[Vehicle]:
+    return parse_vehicle(query, _vocabulary(conn, db_path))
+
+
+def _part_number_candidates(query: str) -> List[str]:
+    return [f"{prefix.upper()}-{digits.upper()}" for prefix, digits in PART_NUMBER_PATTERN.findall(query)]
+
+
+def _vehicle_codes(query: str, vehicle: Optional[Vehicle], vocabulary: List[Tuple[str, str]]) -> set:
+    """Words that name a vehicle rather than a part: every known model as one word ("f150"),
+    and the word right after the model named in the query, e.g. a chassis code ("3 Series E46")."""
+    codes = {"".join(tokenize(model)) for _, model in vocabulary}
+    if vehicle is None:
+        return codes
+    codes.update(vehicle.tokens)
+    tokens = tokenize(query)
+    for position, token in enumerate(tokens[:-1]):
+        if token in vehicle.tokens and not YEAR_PATTERN.match(token) and tokens[position + 1] not in vehicle.tokens:
+            codes.add(tokens[position + 1])
+    return codes
+
+
+def part_number_mentions(query: str, db_path: Path = DB_PATH) -> List[str]:
+    """Part numbers written in the query, without the ones that name the vehicle ("Ford F-150", "BMW E46").
+
+    A candidate that exists in the catalog is always kept.
+    """
+    written = {f"{match.group(1).upper()}-{match.group(2).upper()}": tokenize(match.group(0))
+               for match in PART_NUMBER_PATTERN.finditer(query)}
+    if not written:
+        return []
+    ensure_parts_index(db_path)
+    conn = _connect_readonly(db_path)
+    try:
+        vocabulary = _vocabulary(conn, db_path)
+        codes = _vehicle_codes(query, parse_vehicle(query, vocabulary), vocabulary)
+        known = _lookup_part_numbers(conn, written)
+    finally:
+        conn.close()
+    return [candidate for candidate, tokens in written.items()
+            if candidate in known or not (set(tokens) <= codes or "".join(tokens) in codes)]
+
+
+def _lookup_part_numbers(conn: sqlite3.Connection, candidates: Iterable[str]) -> Dict[str, Tuple[str, int]]:
+    """Resolve many part numbers in one query; spare_parts wins over inventory."""
+    candidates = sorted(set(candidates))
+    if not candidates:
+        return {}
+    placeholders = ", ".join("?" * len(candidates))
+    sql = " UNION ALL ".join(
+        f"SELECT '{source}' AS source, id, upper(part_number) AS part_number FROM {source} "
+        f"WHERE part_number COLLATE NOCASE IN ({placeholders})"
+        for source in SOURCE_QUERIES
+    )
+    found: Dict[str, Tuple[str, int]] = {}
+    for source, source_id, part_number in conn.execute(sql, candidates * len(SOURCE_QUERIES)):
+        found.setdefault(part_number, (source, source_id))
+    return found
+
+
+def _search_names_batch(conn: sqlite3.Connection, token_lists: List[List[str]],
+                        limit: int = 10) -> List[List[sqlite3.Row]]:
+    """One full-text query for several mentions; rows come back grouped per mention."""
+    if not token_lists:
+        return []
+    sql = " UNION ALL ".join(
+        "SELECT * FROM (SELECT ? AS mention, part_number, name, source, source_id FROM parts_fts "
+        "WHERE parts_fts MATCH ? ORDER BY bm25(parts_fts, 10.0, 5.0, 1.0) LIMIT ?)"
+        for _ in token_lists
+    )
+    params = []
+    for position, tokens in enumerate(token_lists):
+        params.extend((position, " OR ".join(f'"{token}"' for token in tokens), limit))
+    grouped: List[List[sqlite3.Row]] = [[] for _ in token_lists]
+    for row in conn.execute(sql, params):
+        grouped[row["mention"]].append(row)
+    return grouped
+
+
+def _pick_confident(rows: List[sqlite3.Row], query_tokens: List[str]) -> Optional[sqlite3.Row]:
+    """Return the single candidate whose name clearly matches the query, if any."""
+    query_set = set(query_tokens)
+    scored = []
+    for row in rows:
+        name_tokens = set(_content_tokens(row["name"]))
+        if not name_tokens:
+            continue
+        shared = name_tokens & query_set
+        scored.append((len(shared) / len(name_tokens), len(shared) / len(query_set), row))
+    if not scored:
+        return None
+
+    # Near-exact: most of the part name is spelled out and no other part does as well.
+    scored.sort(key=lambda item: item[0], reverse=True)
+    best_name, _, best_row = scored[0]
+    if best_name >= NAME_COVERAGE_THRESHOLD and (len(scored) == 1 or scored[1][0] < best_name):
+        return best_row
+
+    # Every query word belongs to exactly one part name, e.g. "spark plugs".
+    full = [row for _, query_cov, row in scored if query_cov == 1.0]
+    if len(full) == 1:
+        return full[0]
+    return None
+
+
+def catalog_terms(db_path: Path = DB_PATH) -> frozenset:
+    """Content words of every part name plus known makes and models, for cheap query routing."""
+    ensure_parts_index(db_path)
+    signature = _checked_signature.get(Path(db_path))
+    cached = _terms_cache.get(Path(db_path))
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    conn = _connect_readonly(db_path)
+    try:
+        terms = set()
+        for (name,) in conn.execute("SELECT name FROM parts_fts"):
+            terms.update(_content_tokens(name))
+        for make, model in vehicle_vocabulary(conn):
+            terms.update(tokenize(f"{make} {model}"))
+    finally:
+        conn.close()
+    # Digits and very short tokens ("3", "1500", "cr") say little about the topic of a question.
+    terms = frozenset(term for term in terms if len(term) > 2 and not term.isdigit())
+    _terms_cache[Path(db_path)] = (signature, terms)
+    return terms
+
+
+def _vehicle_tokens(vehicle: Optional[Vehicle], tokens: List[str]) -> List[str]:
+    if vehicle is None:
+        return tokens
+    return [token for token in tokens if token not in vehicle.tokens and not YEAR_PATTERN.match(token)]
+
+
+def split_part_mentions(query: str, db_path: Path = DB_PATH) -> List[str]:
+    """Every part a question asks for: part numbers as written, plus one phrase per listed part name.
+
+    "oil filter, brake pads and spark plugs for a 2019 Camry" gives
+    ["oil filter", "brake pads", "spark plugs"]; the vehicle applies to all of them.
+    """
+    mentions = part_number_mentions(query, db_path)
+    terms = catalog_terms(db_path)
+    conn = _connect_readonly(db_path)
+    try:
+        vehicle = _vehicle_in_query(conn, db_path, query)
+    finally:
+        conn.close()
+    remainder = PART_NUMBER_PATTERN.sub(" ", query.lower())
+    for chunk in MENTION_SEPARATOR_PATTERN.split(remainder):
+        tokens = _vehicle_tokens(vehicle, _content_tokens(chunk))
+        positions = [i for i, token in enumerate(tokens) if token in terms]
+        if not positions:
+            continue
+        # Keep the span between the first and last catalog word: "change my engine oil" -> "engine oil".
+        mention = " ".join(tokens[positions[0]:positions[-1] + 1])
+        if mention not in mentions:
+            mentions.append(mention)
+    return mentions
+
+
+@instrument("sql", "lookup_parts")
+def lookup_parts(mentions: List[str], query: str = "", db_path: Path = DB_PATH) -> List[PartMatch]:
+    """Resolve several part mentions at once, narrowed to the vehicle named in `query` if any.
+
+    Part numbers are resolved with one query and names with one full-text query, and all
+    matching rows are loaded in one query per table.
+    """
+    try:
+        ensure_parts_index(db_path)
+        conn = _connect_readonly(db_path)
+    except sqlite3.Error as e:
+        print(f"Parts index unavailable: {e}")
+        return [PartMatch(mention, [], "unavailable") for mention in mentions]
+
+    try:
+        refs: Dict[str, Tuple[List[Tuple[str, int]], str]] = {}
+        numbers = _lookup_part_numbers(conn, [c for m in mentions for c in _part_number_candidates(m)])
+        for mention in mentions:
+            found = [numbers[c] for c in _part_number_candidates(mention) if c in numbers]
+            if found:
+                refs[mention] = (found, "part_number")
+
+        vehicle = _vehicle_in_query(conn, db_path, query or " ".join(mentions))
+        fitting = set(parts_for_vehicle(conn, vehicle.model, vehicle.year, vehicle.make)) if vehicle else None
+        by_name = [m for m in mentions if m not in refs]
+        token_lists = [_vehicle_tokens(vehicle, _content_tokens(m)) for m in by_name]
+        searchable = [(m, tokens) for m, tokens in zip(by_name, token_lists) if tokens]
+        grouped = _search_names_batch(conn, [tokens for _, tokens in searchable])
+        for (mention, tokens), rows in zip(searchable, grouped):
+            if fitting is not None:
+                rows = [row for row in rows if (row["source"], row["source_id"]) in fitting]
+            best = _pick_confident(rows, tokens)
+            if best is not None:
+                refs[mention] = ([(best["source"], best["source_id"])], "name+fitment" if fitting is not None else "name")
+                continue
+            # No single winner: every part whose name contains all the mentioned words.
+            query_set = set(tokens)
+            candidates = [(row["source"], row["source_id"]) for row in rows
+                          if query_set <= set(_content_tokens(row["name"]))][:MAX_CANDIDATES_PER_MENTION]
+            if candidates:
+                refs[mention] = (candidates, "candidates")
+
+        loaded = _load_parts(conn, [ref for found, _ in refs.values() for ref in found])
+        matches = []
+        for mention in mentions:
+            found, match_type = refs.get(mention, ([], "no_match"))
+            parts = [loaded[ref] for ref in found if ref in loaded]
+            matches.append(PartMatch(mention, parts, match_type if parts else "no_match"))
+        return matches
+    except sqlite3.Error as e:
+        print(f"Parts lookup failed: {e}")
+        return [PartMatch(mention, [], "unavailable") for mention in mentions]
+    finally:
+        conn.close()
+
+
+@instrument("sql", "find_parts_for_vehicle")
+def find_parts_for_vehicle(
+    model: str, year: Optional[int] = None, make: Optional[str] = None, db_path: Path = DB_PATH
+) -> List[PartDetails]:
+    """List every part that fits the given vehicle and model year."""
+    ensure_parts_index(db_path)
+    conn = _connect_readonly(db_path)
+    try:
+        refs = parts_for_vehicle(conn, model, year, make)
+        loaded = _load_parts(conn, refs)
+    finally:
+        conn.close()
+    return [loaded[ref] for ref in refs if ref in loaded]
+
+
+if __name__ == "__main__":
+    connection = connect_index(DB_PATH, index_mode="rwc")
+    try:
+        print(f"Indexed {build_parts_index(connection)} parts from {DB_PATH} into {index_path(DB_PATH)}")
+        fitments = connection.execute("SELECT count(*) FROM vehicle_fitment").fetchone()[0]
+        print(f"Indexed {fitments} vehicle fitment rows")
+    finally:
+        connection.close()
@@ -1,37 +1,160 @@
-from pathlib import Path
-from typing import Any, Dict, List
+import threading
+from pathlib import Path, PureWindowsPath
+from typing import Any, Dict, List, Optional, Tuple
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from typing import Iterable
 from langchain_core.documents import Document as LCDocument
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.embeddings import Embeddings
+
+from src.context import RAG_CONTEXT_TOKENS, ContextSection, assemble_context
+from src.tools.embedding_cache import cached_embeddings
+from src.tools.lexical_index import BM25Index, HybridRetriever, load_lexical_index
+from src.tools.vector_index import index_files, load_vector_index
 
 # Location of the persisted FAISS vectorstore.
 VECTORSTORE_PATH = Path(__file__).resolve().parents[2] / "data" / "vectorstore"
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+
+
+class RetrievalService:
+    """Process-wide embedding model and FAISS index, loaded lazily and reloaded on change."""
+
+    def __init__(self, path: Path = VECTORSTORE_PATH, model_name: str = EMBEDDING_MODEL):
+        self.path = Path(path)
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._embeddings: Optional[Embeddings] = None
+        self._vectorstore: Optional[FAISS] = None
+        self._lexical_index: Optional[BM25Index] = None
+        self._signature: Optional[Tuple] = None
+
+    # Modification time and size of the index files, used to detect a rebuild.
+    def _index_signature(self) -> Tuple:
+        signature = []
+        for name in index_files(self.path):
+            try:
+                stat = (self.path / name).stat()
+            except FileNotFoundError:
+                return ()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    # The HF stack (and torch) is only imported when the model is actually needed.
+    def _load_model(self) -> Embeddings:
+        from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=self.model_name)
+
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    # Repeated queries are served from the disk cache without running the model.
+                    self._embeddings = cached_embeddings(self._load_model, self.model_name)
+        return self._embeddings
+
+    def set_embeddings(self, embeddings: Embeddings) -> None:
+        """Use another embeddings object (e.g. a local fake in benchmarks) and reload the index with it."""
+        with self._lock:
+            self._embeddings = embeddings
+            self._vectorstore = None
+            self._signature = None
+
+    def vectorstore(self) -> FAISS:
+        signature = self._index_signature()
+        if self._vectorstore is None or signature != self._signature:
+            embeddings = self.embeddings()
+            with self._lock:
+                # Another thread may have loaded the same version while we waited.
+                if self._vectorstore is None or signature != self._signature:
+                    print(f"--- LOADING VECTORSTORE FROM {self.path} ---")
+                    self._vectorstore = load_vector_index(self.path, embeddings)
+                    self._lexical_index = load_lexical_index(self._vectorstore, self.path)
+                    self._signature = signature
+        return self._vectorstore
+
+    def lexical_index(self) -> BM25Index:
+        """BM25 index over the same chunks as the loaded vectorstore."""
+        self.vectorstore()
+        return self._lexical_index
+
+    def retriever(self) -> HybridRetriever:
+        vectorstore = self.vectorstore()
+        return HybridRetriever(vectorstore=vectorstore, lexical_index=self._lexical_index)
 
+    def warmup(self) -> None:
+        """Load the model and index so the first query is fast."""
+        self.vectorstore()
+        embeddings = self.embeddings()
+        # Force the model itself to load even when the cache would answer the probe.
+        getattr(embeddings, "inner", embeddings).embed_query("warmup")
 
-# Load the FAISS vectorstore from disk using the same embeddings.
+    def reset(self) -> None:
+        with self._lock:
+            self._vectorstore = None
+            self._lexical_index = None
+            self._signature = None
+
+
+retrieval_service = RetrievalService()
+
+
+# Preload retrieval resources only; resources.warmup() also opens the SQL database.
+def warmup() -> None:
+    retrieval_service.warmup()
+
+
+# Return the shared FAISS vectorstore, reloading it if the files on disk changed.
 def load_vectorstore() -> FAISS:
     """Load FAISS vectorstore from disk."""
-    embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    vectorstore = FAISS.load_local(
-        str(VECTORSTORE_PATH),
-        embeddings,
-        allow_dangerous_deserialization=True,
-    )
-    return vectorstore
+    return retrieval_service.vectorstore()
+
+def _doc_label(rank: int, doc: LCDocument) -> str:
+    source = doc.metadata.get("source")
+    if source is None:
+        return f"[{rank}]"
+    page = doc.metadata.get("page")
+    # Sources may be Windows paths recorded at ingestion; the Windows flavour splits both separators.
+    # Pages are stored 1-based by load_pdf_with_pdfplumber.
+    return f"[{PureWindowsPath(source).name}" + (f" p.{page}]" if isinstance(page, int) else "]")
+
 
-# Join retrieved documents into a single context string.
+# Join retrieved documents, best first, into a context within the RAG token budget;
+# text repeated by overlapping chunks is only kept once.
 def format_docs(docs: Iterable[LCDocument]):
-    return "\n\n".join(doc.page_content for doc in docs)
+    sections = [ContextSection(_doc_label(rank, doc), doc.page_content) for rank, doc in enumerate(docs, 1)]
+    return assemble_context(sections, RAG_CONTEXT_TOKENS, name="rag", separator="\n\n").text
+
+def interleave(rankings: List[List[LCDocument]]) -> List[LCDocument]:
+    """Merge ranked lists round-robin, best of each first, keeping each chunk once."""
+    merged, seen = [], set()
+    for rank in range(max((len(ranking) for ranking in rankings), default=0)):
+        for ranking in rankings:
+            if rank < len(ranking):
+                doc = ranking[rank]
+                key = doc.id or doc.page_content
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(doc)
+    return merged
+
 
 # Build a RAG chain that uses the vectorstore retriever and an LLM.
-def search_documents( llm=None):
-    """Search the vectorstore for documents similar to the query."""
-    vectorstore = load_vectorstore()
-    retriever = vectorstore.as_retriever()
+def search_documents(llm=None, found_parts: Optional[List[str]] = None):
+    """Search the catalogs with hybrid retrieval: exact part codes via BM25, meaning via FAISS.
+
+    When the question names several parts, each of them is also retrieved on its own in
+    the same batched embedding and FAISS search, so every part gets catalog context.
+    """
+    retriever = hybrid = retrieval_service.retriever()
+    if found_parts and len(found_parts) > 1:
+        retriever = RunnableLambda(
+            lambda question: interleave(hybrid.retrieve_many([question, *found_parts])),
+            name="multi_part_retriever",
+        )
     
     prompt = PromptTemplate.from_template(
         "Context information is below.\n---------------------\n{context}\n---------------------\nGiven the context information and not prior knowledge, answer the query.\nQuery: {question}\nAnswer:\n"
@@ -44,4 +167,3 @@ def search_documents( llm=None):
         | StrOutputParser()
     )
     return rag_chain
-        
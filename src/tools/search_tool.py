@@ -1,41 +1,224 @@
 # Web search helper utilities.
-from typing import Any, Dict, List
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.tools import DuckDuckGoSearchResults
+import json
+import re
+import statistics
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
 import os
-from src.state import AgentState
 
-# Execute a targeted web search for pricing and availability context.
-def web_search(query: str):
-    """
-    Enhanced search specifically tuned to find retail prices and 
-    competitor stock levels for spare parts.
+from src.telemetry import record_cache, span
+
+SEARCH_FAILED_MESSAGE = "No external market pricing could be retrieved at this moment."
+
+SEARCH_TTL_SECONDS = float(os.getenv("WEB_CACHE_TTL", "900"))
+MAX_CACHED_SEARCHES = 1000
+MAX_RESULTS = 5
+
+# Words that do not change which part is being searched for.
+QUERY_STOPWORDS = {
+    "a", "an", "and", "any", "are", "available", "buy", "can", "compare", "cost", "do", "does",
+    "for", "have", "how", "i", "in", "is", "market", "me", "much", "my", "need", "of", "offer",
+    "please", "price", "pricing", "stock", "the", "to", "want", "what", "with", "you", "your",
+}
+
+PRICE_PATTERN = re.compile(
+    r"(?P<prefix>US\$|USD|EUR|GBP|\$|€|£)\s?(?P<amount>\d{1,3}(?:,\d{3})*(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+    r"|(?P<amount2>\d{1,3}(?:,\d{3})*(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)\s?(?P<suffix>USD|EUR|GBP|€)",
+    re.IGNORECASE,
+)
+CURRENCY_CODES = {"$": "USD", "US$": "USD", "USD": "USD", "€": "EUR", "EUR": "EUR", "£": "GBP", "GBP": "GBP"}
+OUT_OF_STOCK_PATTERN = re.compile(r"out of stock|sold out|unavailable|backorder", re.IGNORECASE)
+IN_STOCK_PATTERN = re.compile(r"in stock|available now|ships (?:today|tomorrow|in)|free shipping|add to cart", re.IGNORECASE)
+
+
+class DuckDuckGoBackend:
+    """Live search through DuckDuckGo; the client is created once and reused."""
+
+    def __init__(self, max_results: int = MAX_RESULTS):
+        self.max_results = max_results
+        self._search = None
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        if self._search is None:
+            from langchain_community.tools import DuckDuckGoSearchResults
+            self._search = DuckDuckGoSearchResults(max_results=self.max_results, output_format="list")
+        return self._search.run(query)
+
+
+class FixtureSearchBackend:
+    """Serves canned results from a JSON file (or dict) of {"keywords": [results]} for offline runs.
+
+    `latency` simulates the round trip of a live search.
     """
-    # 1. Initialize the search tool that returns multiple snippets
-    # 'max_results' helps get a broader view of the market
-    search = DuckDuckGoSearchResults(max_results=5)
-    
-    # 2. Refine the search query for 'Shopping' intent
-    # We add specific keywords to trigger price listings and marketplace results
+
+    def __init__(self, path: Optional[Path] = None, fixtures: Optional[Dict[str, List[Dict[str, str]]]] = None,
+                 latency: float = 0.0):
+        if fixtures is None:
+            with open(path, encoding="utf-8") as f:
+                fixtures = json.load(f)
+        self.fixtures: Dict[str, List[Dict[str, str]]] = fixtures
+        self.latency = latency
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        if self.latency:
+            time.sleep(self.latency)
+        tokens = set(_tokens(query))
+        best, best_size = self.fixtures.get("*", []), 0
+        for keywords, results in self.fixtures.items():
+            words = set(_tokens(keywords))
+            if words and words <= tokens and len(words) > best_size:
+                best, best_size = results, len(words)
+        return best
+
+
+_backend: Any = DuckDuckGoBackend()
+# Insertion order is expiry order, since every entry gets the same TTL.
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_in_flight: Dict[str, Future] = {}
+_lock = threading.Lock()
+
+
+def set_search_backend(backend) -> None:
+    """Swap the search backend (e.g. a FixtureSearchBackend in tests) and clear the cache."""
+    global _backend
+    with _lock:
+        _backend = backend
+        _cache.clear()
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", (text or "").lower())
+
+
+def normalize_part_query(query: str) -> str:
+    """Reduce a customer question to the part it asks about, e.g. 'alternator 130a remanufactured'."""
+    tokens = [token for token in _tokens(query) if token not in QUERY_STOPWORDS]
+    return " ".join(tokens) or query.strip().lower()
+
+
+def _vendor(result: Dict[str, str]) -> str:
+    host = urlparse(result.get("link", "")).netloc.lower()
+    if host:
+        return host[4:] if host.startswith("www.") else host
+    title = result.get("title", "")
+    return re.split(r"\s[-|]\s", title)[-1].strip() if title else "unknown"
+
+
+def _stock(text: str) -> str:
+    if OUT_OF_STOCK_PATTERN.search(text):
+        return "out_of_stock"
+    if IN_STOCK_PATTERN.search(text):
+        return "in_stock"
+    return "unknown"
+
+
+def extract_offers(results: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Parse search snippets into price/currency/vendor/stock records."""
+    offers = []
+    for result in results:
+        text = f"{result.get('title', '')} {result.get('snippet', '')}"
+        match = PRICE_PATTERN.search(text)
+        if not match:
+            continue
+        amount = match.group("amount") or match.group("amount2")
+        symbol = (match.group("prefix") or match.group("suffix")).upper()
+        price = float(amount.replace(",", ""))
+        if price <= 0:
+            continue
+        offers.append({
+            "vendor": _vendor(result),
+            "price": price,
+            "currency": CURRENCY_CODES.get(symbol, symbol),
+            "stock": _stock(text),
+            "title": result.get("title", "")[:80],
+            "link": result.get("link", ""),
+        })
+    return offers
+
+
+def summarize_offers(offers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not offers:
+        return {"offers_found": 0}
+    # Statistics only make sense within one currency; use the most common one.
+    currency = Counter(offer["currency"] for offer in offers).most_common(1)[0][0]
+    prices = sorted(offer["price"] for offer in offers if offer["currency"] == currency)
+    return {
+        "offers_found": len(offers),
+        "currency": currency,
+        "min_price": prices[0],
+        "median_price": round(statistics.median(prices), 2),
+        "max_price": prices[-1],
+        "in_stock_offers": sum(1 for offer in offers if offer["stock"] == "in_stock"),
+    }
+
+
+def _run_search(part_query: str) -> Dict[str, Any]:
+    # Refine the search query for 'Shopping' intent, excluding social media for cleaner data.
     refined_query = (
-        f'{query} price shop online stock availability '
-        f'-(site:youtube.com | site:facebook.com)' # Exclude social media for cleaner data
+        f'{part_query} price shop online stock availability '
+        f'-(site:youtube.com | site:facebook.com)'
     )
-    
     print(f"--- 🌐 SEARCHING WEB FOR: {refined_query} ---")
-    
     try:
-        # 3. Execute the search
-        # This returns a string containing multiple titles, snippets, and links
-        search_results = search.run(refined_query)
-        
-        # If the search is too specific and returns nothing, try a broader one
-        if not search_results or "snippet" not in search_results.lower():
-            search_results = search.run(f"average price of {query} spare part")
-            
+        with span("search", type(_backend).__name__):
+            offers = extract_offers(_backend.search(refined_query))
+        # If the search is too specific and finds no prices, try a broader one.
+        if not offers:
+            with span("search", type(_backend).__name__, fallback=True):
+                offers = extract_offers(_backend.search(f"average price of {part_query} spare part"))
     except Exception as e:
         print(f"Web search failed: {e}")
-        search_results = "No external market pricing could be retrieved at this moment."
-        
-    return search_results
\ No newline at end of file
+        return {"query": part_query, "offers": [], "market": {"offers_found": 0}, "error": SEARCH_FAILED_MESSAGE}
+    return {"query": part_query, "offers": offers, "market": summarize_offers(offers)}
+
+
+# Execute a targeted web search for pricing and availability context.
+def web_search(query: str) -> Dict[str, Any]:
+    """
+    Search for retail prices and competitor stock levels for a spare part.
+    Results are cached per normalized part for a short TTL, and concurrent
+    identical searches share a single upstream call.
+    """
+    key = normalize_part_query(query)
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            record_cache("web_search", hits=1)
+            return cached[1]
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _in_flight[key] = future
+
+    # Joining an identical in-flight search counts as a hit: no upstream call is made.
+    record_cache("web_search", hits=int(not leader), misses=int(leader))
+    if not leader:
+        return future.result()
+
+    try:
+        result = _run_search(key)
+        with _lock:
+            # Failed searches are shared with waiting callers but not cached.
+            if "error" not in result:
+                now = time.monotonic()
+                _cache.pop(key, None)
+                while _cache and next(iter(_cache.values()))[0] <= now:
+                    _cache.popitem(last=False)
+                # Nothing has expired: drop the oldest entries so the cache stays bounded.
+                while len(_cache) >= MAX_CACHED_SEARCHES:
+                    _cache.popitem(last=False)
+                _cache[key] = (now + SEARCH_TTL_SECONDS, result)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
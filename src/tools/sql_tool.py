@@ -1,16 +1,169 @@
+import os
 import sqlite3
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
+from typing import Dict, Optional, Tuple
+
+from src.resources import DB_PATH, resources
+from src.telemetry import span
+
+# The agent only sees the catalog tables, not the local search index tables.
+AGENT_TABLES = ["spare_parts", "inventory"]
+
+# Read-only connections shared by concurrent agent queries.
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "4"))
+# Seconds a statement may run (or wait for a lock) before SQLite interrupts it.
+SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "5"))
+# Prepared statements kept per connection; the agent repeats the same query shapes.
+SQL_STATEMENT_CACHE = int(os.getenv("SQL_STATEMENT_CACHE", "128"))
+SCHEMA_SAMPLE_ROWS = 3
+SAMPLE_VALUE_CHARS = 60
+# SQLite VM instructions between deadline checks.
+PROGRESS_STEPS = 10_000
+
+QUERY_TOOL_DESCRIPTION = (
+    "Run a read-only SQLite query against the spare_parts and inventory tables described in "
+    "the instructions and return the rows. If the query fails, read the error, fix the query "
+    "and try again."
+)
+
+_schema_lock = threading.Lock()
+_schema_cache: Dict[Path, Tuple[tuple, str]] = {}
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that interrupts a statement running past its deadline."""
+
+    deadline: Optional[float] = None
+
+    def past_deadline(self) -> int:
+        return int(self.deadline is not None and time.monotonic() > self.deadline)
+
+
+def connect_readonly(db_path: Path = DB_PATH) -> TimedConnection:
+    """mode=ro plus query_only: writes fail in SQLite itself, whatever SQL the agent produces.
+
+    Read-only connections never take the write lock, so with a WAL journal they keep
+    reading while a sync writes to the database.
+    """
+    conn = sqlite3.connect(
+        f"file:{Path(db_path).as_posix()}?mode=ro",
+        uri=True,
+        timeout=SQL_QUERY_TIMEOUT,
+        cached_statements=SQL_STATEMENT_CACHE,
+        check_same_thread=False,
+        factory=TimedConnection,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.set_progress_handler(conn.past_deadline, PROGRESS_STEPS)
+    return conn
+
+
+def _file_signature(db_path: Path) -> tuple:
+    stat = Path(db_path).stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _sample_value(value) -> str:
+    text = " ".join(str(value).split())
+    return text if len(text) <= SAMPLE_VALUE_CHARS else text[:SAMPLE_VALUE_CHARS] + "..."
+
+
+def _describe_table(conn: sqlite3.Connection, table: str) -> str:
+    (create_sql,) = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    cursor = conn.execute(f"SELECT * FROM {table} LIMIT {SCHEMA_SAMPLE_ROWS}")
+    columns = [column[0] for column in cursor.description]
+    rows = ["\t".join(_sample_value(value) for value in row) for row in cursor.fetchall()]
+    return "\n".join([
+        " ".join(create_sql.split()),
+        f"/* {len(rows)} rows from {table}:",
+        "\t".join(columns),
+        *rows,
+        "*/",
+    ])
+
+
+def schema_context(db_path: Path = DB_PATH) -> str:
+    """CREATE TABLE statements and sample rows of the agent tables, rebuilt only when the file changes."""
+    db_path = Path(db_path)
+    signature = _file_signature(db_path)
+    cached = _schema_cache.get(db_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with _schema_lock:
+        cached = _schema_cache.get(db_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with span("sql", "schema_context"):
+            conn = connect_readonly(db_path)
+            try:
+                text = "\n\n".join(_describe_table(conn, table) for table in AGENT_TABLES)
+            finally:
+                conn.close()
+        _schema_cache[db_path] = (signature, text)
+        return text
 
 
 # SQL helper utilities for the local inventory database.
-# Load the local database connection for SQL tools.
-db = SQLDatabase.from_uri("sqlite:///data/spare_parts.db")
+def open_sql_database(db_path: Path = DB_PATH):
+    """SQLDatabase over a pool of read-only connections; every statement the agent runs is a "sql" span."""
+    from langchain_community.utilities import SQLDatabase
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.pool import QueuePool
+
+    class InstrumentedSQLDatabase(SQLDatabase):
+        def run(self, command, *args, **kwargs):
+            with span("sql", "sql_database.run"):
+                return super().run(command, *args, **kwargs)
+
+    engine = create_engine(
+        "sqlite://",
+        creator=lambda: connect_readonly(db_path),
+        poolclass=QueuePool,
+        pool_size=SQL_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=SQL_QUERY_TIMEOUT,
+    )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_deadline(conn, cursor, statement, parameters, context, executemany):
+        conn.connection.dbapi_connection.deadline = time.monotonic() + SQL_QUERY_TIMEOUT
+
+    # Rows are stepped out of SQLite while they are fetched, after the execute events have
+    # fired, so the deadline stays armed until the connection goes back to the pool.
+    @event.listens_for(engine, "checkin")
+    def clear_deadline(dbapi_connection, connection_record):
+        if dbapi_connection is not None:
+            dbapi_connection.deadline = None
+
+    @event.listens_for(engine, "handle_error")
+    def clear_deadline_on_error(context):
+        if context.connection is not None and not context.connection.invalidated:
+            context.connection.connection.dbapi_connection.deadline = None
+
+    # Tables are only reflected if something asks for their schema; the agent gets schema_context().
+    return InstrumentedSQLDatabase(engine, include_tables=AGENT_TABLES, lazy_table_reflection=True)
+
+
+@lru_cache(maxsize=None)
+def _query_only_toolkit():
+    from langchain_community.agent_toolkits import SQLDatabaseToolkit
+    from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
+
+    class QueryOnlyToolkit(SQLDatabaseToolkit):
+        """Only sql_db_query: the schema is already in the prompt, so listing tables and
+        reading schemas would just cost the agent extra LLM round trips."""
+
+        def get_tools(self):
+            return [QuerySQLDatabaseTool(db=self.db, description=QUERY_TOOL_DESCRIPTION)]
+
+    return QueryOnlyToolkit
+
 
 # Build a toolkit wrapper for the SQL agent.
 def get_sql_toolkit(llm):
-    return SQLDatabaseToolkit(db=db, llm=llm)
\ No newline at end of file
+    return _query_only_toolkit()(db=resources.sql_database(), llm=llm)
@@ -0,0 +1,326 @@
+# FAISS index construction (flat / IVF / HNSW), memory-mapped loading and an on-disk SQLite docstore.
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.db"
+META_FILE = "index.json"
+# Pickled docstore written by FAISS.save_local; still readable until the next ingestion.
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# Build settings, stored in index.json so the index can be rebuilt the same way.
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 picks about 4 * sqrt(vectors)
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+
+# Search settings, applied every time the index is loaded.
+IVF_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+MMAP_ENABLED = os.getenv("FAISS_MMAP", "1") != "0"
+
+# IVF inverted lists and flat code arrays (flat and HNSW storage) are mapped by different flags,
+# and faiss rejects the two combined.
+IVF_MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+CODES_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id           TEXT PRIMARY KEY,
+    page_content TEXT NOT NULL,
+    metadata     TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS positions (
+    position INTEGER PRIMARY KEY,
+    id       TEXT NOT NULL
+);
+"""
+
+
+class IndexSettings(NamedTuple):
+    index_type: str = INDEX_TYPE
+    nlist: int = IVF_NLIST
+    hnsw_m: int = HNSW_M
+    ef_construction: int = HNSW_EF_CONSTRUCTION
+
+
+class SearchSettings(NamedTuple):
+    nprobe: int = IVF_NPROBE
+    ef_search: int = HNSW_EF_SEARCH
+
+
+def resolve_nlist(requested: int, vector_count: int) -> int:
+    """Number of IVF cells; k-means wants at least 39 training vectors per cell."""
+    nlist = requested or int(4 * vector_count ** 0.5)
+    return max(1, min(nlist, vector_count // 39))
+
+
+def build_faiss_index(vectors: np.ndarray, settings: IndexSettings) -> faiss.Index:
+    """Create an L2 index of the requested type and add the vectors."""
+    if settings.index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {settings.index_type!r}; expected one of {INDEX_TYPES}")
+    dim = vectors.shape[1]
+    if settings.index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif settings.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings.hnsw_m)
+        index.hnsw.efConstruction = settings.ef_construction
+    else:
+        nlist = resolve_nlist(settings.nlist, len(vectors))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def update_faiss_index(index: faiss.Index, labels: Dict[int, str], keep: Set[str], vectors: np.ndarray,
+                       new_ids: List[str]) -> Optional[Dict[int, str]]:
+    """Remove the vectors whose docstore id is not in `keep` and add `vectors` for new_ids, in place.
+
+    Returns the new label -> docstore id map, or None when the index cannot remove vectors (HNSW)
+    and has to be rebuilt instead. IVF keeps its centroids and the labels of surviving vectors;
+    flat and HNSW indexes number their vectors by position.
+    """
+    stale = [label for label, chunk_id in labels.items() if chunk_id not in keep]
+    kind = index_kind(index)
+    if stale and kind == "hnsw":
+        return None
+    if stale:
+        index.remove_ids(np.asarray(stale, dtype=np.int64))
+    if kind == "ivf":
+        labels = {label: chunk_id for label, chunk_id in labels.items() if chunk_id in keep}
+        start = max(labels, default=-1) + 1
+        new_labels = np.arange(start, start + len(new_ids), dtype=np.int64)
+        if new_ids:
+            index.add_with_ids(vectors, new_labels)
+        labels.update(zip(new_labels.tolist(), new_ids))
+        return labels
+    # A flat index closes the gaps left by removed vectors, so positions shift down.
+    remaining = [chunk_id for _, chunk_id in sorted(labels.items()) if chunk_id in keep]
+    if new_ids:
+        index.add(vectors)
+    return dict(enumerate(remaining + list(new_ids)))
+
+
+def apply_search_settings(index: faiss.Index, settings: SearchSettings) -> None:
+    """Set the recall/latency knobs of approximate indexes; flat indexes have none."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.ef_search
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.nprobe, ivf.nlist)
+
+
+def stored_vectors(index: faiss.Index, labels: Optional[Sequence[int]] = None) -> np.ndarray:
+    """Vectors of an index for the given labels, or all of them in position order."""
+    if labels is None:
+        labels = range(index.ntotal)
+    if len(labels) == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Labels of an updated IVF index are not contiguous, which the array direct map requires.
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index.reconstruct_batch(np.asarray(labels, dtype=np.int64))
+    if isinstance(labels, range) and labels == range(index.ntotal):
+        return index.reconstruct_n(0, index.ntotal)
+    return np.vstack([index.reconstruct(int(label)) for label in labels])
+
+
+def index_kind(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    return "flat"
+
+
+class SQLiteDocstore(Docstore):
+    """Chunks stored on disk and read one at a time, so the corpus never has to fit in memory."""
+
+    def __init__(self, path: Path, read_only: bool = True):
+        self.path = Path(path)
+        self.read_only = read_only
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path.as_posix()}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def search(self, search: str) -> Union[str, LCDocument]:
+        row = self._conn().execute(
+            "SELECT page_content, metadata FROM documents WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return LCDocument(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def texts(self) -> Iterator[Tuple[str, str]]:
+        """(id, text) of every indexed chunk in position order."""
+        yield from self._conn().execute(
+            "SELECT d.id, d.page_content FROM positions p JOIN documents d ON d.id = p.id ORDER BY p.position"
+        )
+
+    def write(self, labels: Dict[int, str], new_docs: Dict[str, LCDocument]) -> None:
+        """Store new chunks, map FAISS labels to chunk ids and drop unused chunks."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, page_content, metadata) VALUES (?, ?, ?)",
+                [(doc_id, doc.page_content, json.dumps(doc.metadata, default=str)) for doc_id, doc in new_docs.items()],
+            )
+            conn.execute("DELETE FROM positions")
+            conn.executemany("INSERT INTO positions (position, id) VALUES (?, ?)", labels.items())
+            conn.execute("DELETE FROM documents WHERE id NOT IN (SELECT id FROM positions)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class PositionMap(Mapping):
+    """FAISS position -> docstore id, looked up in the docstore instead of held in a dict."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+        self._len: Optional[int] = None
+
+    def __getitem__(self, position) -> str:
+        row = self.docstore._conn().execute(
+            "SELECT id FROM positions WHERE position = ?", (int(position),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def ids_for(self, positions: Sequence[int]) -> Dict[int, str]:
+        """Docstore ids of many positions with one query (batched searches)."""
+        wanted = sorted({int(position) for position in positions})
+        if not wanted:
+            return {}
+        placeholders = ", ".join("?" * len(wanted))
+        return dict(self.docstore._conn().execute(
+            f"SELECT position, id FROM positions WHERE position IN ({placeholders})", wanted
+        ))
+
+    def __iter__(self) -> Iterator[int]:
+        for (position,) in self.docstore._conn().execute("SELECT position FROM positions ORDER BY position"):
+            yield position
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = self.docstore._conn().execute("SELECT count(*) FROM positions").fetchone()[0]
+        return self._len
+
+    def values(self) -> List[str]:
+        return [row[0] for row in self.docstore._conn().execute("SELECT id FROM positions ORDER BY position")]
+
+    def items(self) -> List[Tuple[int, str]]:
+        return self.docstore._conn().execute("SELECT position, id FROM positions ORDER BY position").fetchall()
+
+
+def read_meta(path: Path) -> dict:
+    try:
+        with open(Path(path) / META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def index_files(path: Path) -> Tuple[str, ...]:
+    """Files that make up the stored vectorstore, in either layout."""
+    if (Path(path) / DOCSTORE_FILE).exists():
+        return (INDEX_FILE, DOCSTORE_FILE)
+    return (INDEX_FILE, LEGACY_DOCSTORE_FILE)
+
+
+def save_vector_index(path: Path, index: faiss.Index, labels: Dict[int, str], new_docs: Dict[str, LCDocument],
+                      settings: IndexSettings, extra_meta: Optional[dict] = None) -> None:
+    """Persist the index, its docstore and index.json; `labels` gives the docstore id of each FAISS label."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    SQLiteDocstore(path / DOCSTORE_FILE, read_only=False).write(labels, new_docs)
+    tmp_path = path / (INDEX_FILE + ".tmp")
+    faiss.write_index(index, str(tmp_path))
+    os.replace(tmp_path, path / INDEX_FILE)
+    meta = dict(extra_meta or {}, index_type=settings.index_type, settings=settings._asdict(),
+                vectors=index.ntotal, dimension=index.d)
+    if settings.index_type == "ivf":
+        meta["ivf_cells"] = faiss.extract_index_ivf(index).nlist
+    tmp_meta = path / (META_FILE + ".tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, path / META_FILE)
+    (path / LEGACY_DOCSTORE_FILE).unlink(missing_ok=True)
+
+
+def load_vector_index(path: Path, embeddings: Embeddings, mmap: bool = MMAP_ENABLED,
+                      search: SearchSettings = SearchSettings()) -> FAISS:
+    """Open the stored vectorstore for querying.
+
+    With mmap the index file is paged in by the OS on demand instead of being read into
+    memory, and documents are fetched from SQLite only for the hits of each query.
+    """
+    path = Path(path)
+    if not (path / DOCSTORE_FILE).exists():
+        vectorstore = FAISS.load_local(str(path), embeddings, allow_dangerous_deserialization=True)
+    else:
+        flags = 0
+        if mmap:
+            flags = IVF_MMAP_FLAGS if read_meta(path).get("index_type") == "ivf" else CODES_MMAP_FLAGS
+        index = faiss.read_index(str(path / INDEX_FILE), flags)
+        docstore = SQLiteDocstore(path / DOCSTORE_FILE)
+        vectorstore = FAISS(embeddings, index, docstore, PositionMap(docstore))
+    apply_search_settings(vectorstore.index, search)
+    return vectorstore
+
+
+def load_for_update(path: Path) -> Tuple[Optional[faiss.Index], Dict[int, str]]:
+    """Stored index (fully in memory) and the docstore id of each FAISS label, for ingestion."""
+    path = Path(path)
+    if not (path / INDEX_FILE).exists():
+        return None, {}
+    if (path / DOCSTORE_FILE).exists():
+        labels = dict(PositionMap(SQLiteDocstore(path / DOCSTORE_FILE)).items())
+        return faiss.read_index(str(path / INDEX_FILE)), labels
+    legacy = FAISS.load_local(str(path), _NoEmbeddings(), allow_dangerous_deserialization=True)
+    return legacy.index, dict(legacy.index_to_docstore_id)
+
+
+def legacy_documents(path: Path, ids: List[str]) -> Dict[str, LCDocument]:
+    """Chunks held in a pickled index.pkl, so they can be moved into the SQLite docstore."""
+    legacy = FAISS.load_local(str(path), _NoEmbeddings(), allow_dangerous_deserialization=True)
+    return {doc_id: legacy.docstore.search(doc_id) for doc_id in ids}
+
+
+class _NoEmbeddings(Embeddings):
+    """Placeholder for loading a vectorstore only to read its stored vectors and documents."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise RuntimeError("embeddings are not available here")
+
+    def embed_query(self, text: str) -> List[float]:
+        raise RuntimeError("embeddings are not available here")
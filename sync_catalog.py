@@ -0,0 +1,295 @@
+# Bulk sync between the CSV exports and the SQLite catalog, in either direction.
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from src.resources import DB_PATH, PROJECT_ROOT
+from src.tools.parts_index import INDEXED_COLUMNS, connect_index, parts_index_current, refresh_parts_index
+
+EXPORTS_DIR = PROJECT_ROOT / "data" / "exports"
+CHANGELOG_PATH = PROJECT_ROOT / "data" / "sync" / "changes.jsonl"
+
+# Rows read, diffed and written per transaction; also bounds the IN (...) lookups.
+CHUNK_ROWS = 1000
+FITMENT_COLUMNS = ("compatible_models",)
+
+
+def _text(value: str) -> Optional[str]:
+    return value.strip() or None
+
+
+def _real(value: str) -> Optional[float]:
+    return float(value) if value.strip() else None
+
+
+def _integer(value: str) -> Optional[int]:
+    return int(float(value)) if value.strip() else None
+
+
+class TableSpec(NamedTuple):
+    name: str
+    # Synced columns and how to parse them from CSV; the id column is local to each database.
+    columns: Dict[str, Callable[[str], object]]
+
+
+TABLES = {
+    "spare_parts": TableSpec("spare_parts", {
+        "part_number": _text, "name": _text, "description": _text, "price": _real,
+        "availability": _text, "category": _text, "compatible_models": _text,
+    }),
+    "inventory": TableSpec("inventory", {
+        "part_number": _text, "name": _text, "compatible_models": _text, "price": _real, "stock": _integer,
+    }),
+}
+
+
+class SyncReport(NamedTuple):
+    table: str
+    read: int
+    inserted: int
+    updated: int
+    unchanged: int
+    deleted: int
+    skipped: int
+    reindexed: int
+    seconds: float
+
+
+def read_chunks(path: Path, spec: TableSpec, chunk_rows: int = CHUNK_ROWS) -> Iterator[List[Dict[str, object]]]:
+    """Parsed CSV rows, chunk_rows at a time; rows without a part number or name are dropped with a warning."""
+    with path.open(newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        missing = [column for column in spec.columns if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing columns: {', '.join(missing)}")
+        chunk = []
+        for line, raw in enumerate(reader, start=2):
+            try:
+                row = {column: parse(raw[column] or "") for column, parse in spec.columns.items()}
+            except ValueError as e:
+                print(f"Skipping {path.name}:{line}: {e}")
+                continue
+            if not row["part_number"] or not row["name"]:
+                print(f"Skipping {path.name}:{line}: part_number and name are required")
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _existing_rows(conn: sqlite3.Connection, spec: TableSpec, part_numbers: List[str]) -> Dict[str, sqlite3.Row]:
+    placeholders = ", ".join("?" * len(part_numbers))
+    columns = ", ".join(["id", *spec.columns])
+    return {row["part_number"]: row for row in conn.execute(
+        f"SELECT {columns} FROM {spec.name} WHERE part_number IN ({placeholders})", part_numbers
+    )}
+
+
+def _change(table: str, action: str, part_number: str, fields: Dict[str, list], sync_id: str) -> dict:
+    return {"sync_id": sync_id, "table": table, "action": action, "part_number": part_number, "fields": fields}
+
+
+def _upsert_sql(spec: TableSpec) -> str:
+    columns = list(spec.columns)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "part_number")
+    return (
+        f"INSERT INTO {spec.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT (part_number) DO UPDATE SET {updates}"
+    )
+
+
+def _apply(conn: sqlite3.Connection, spec: TableSpec, upserts: List[Dict[str, object]], deleted_ids: List[int],
+           search_numbers: Set[str], fitment_numbers: Set[str], index_current: bool) -> int:
+    """Write one chunk and re-index the rows it touched; the caller owns the transaction."""
+    if upserts:
+        conn.executemany(_upsert_sql(spec), [tuple(row[column] for column in spec.columns) for row in upserts])
+    if deleted_ids:
+        conn.executemany(f"DELETE FROM {spec.name} WHERE id = ?", [(row_id,) for row_id in deleted_ids])
+    if not index_current:
+        return 0
+    numbers = sorted(search_numbers | fitment_numbers)
+    ids = {}
+    if numbers:
+        placeholders = ", ".join("?" * len(numbers))
+        ids = dict(conn.execute(
+            f"SELECT part_number, id FROM {spec.name} WHERE part_number IN ({placeholders})", numbers
+        ).fetchall())
+    search_ids = [ids[number] for number in search_numbers if number in ids] + deleted_ids
+    fitment_ids = [ids[number] for number in fitment_numbers if number in ids] + deleted_ids
+    # Price and stock updates leave the index (and its fingerprint) as they are.
+    if search_ids or fitment_ids:
+        refresh_parts_index(conn, spec.name, search_ids, fitment_ids)
+    return len(set(search_ids) | set(fitment_ids))
+
+
+def sync_table(conn: sqlite3.Connection, spec: TableSpec, csv_path: Path, changelog, sync_id: str,
+               delete_missing: bool = False, dry_run: bool = False, chunk_rows: int = CHUNK_ROWS) -> SyncReport:
+    """Upsert changed rows from csv_path chunk by chunk; each chunk is one transaction."""
+    started = time.perf_counter()
+    counts = dict.fromkeys(("read", "inserted", "updated", "unchanged", "deleted", "skipped", "reindexed"), 0)
+    # The index is only patched row by row if it was current; otherwise the app rebuilds it on next use.
+    index_current = parts_index_current(conn)
+    seen: Set[str] = set()
+
+    for chunk in read_chunks(csv_path, spec, chunk_rows):
+        counts["read"] += len(chunk)
+        rows = {}
+        for row in chunk:
+            if row["part_number"] in rows or row["part_number"] in seen:
+                counts["skipped"] += 1
+                print(f"Skipping duplicate part number {row['part_number']} in {csv_path.name}")
+                continue
+            rows[row["part_number"]] = row
+        seen.update(rows)
+        existing = _existing_rows(conn, spec, list(rows))
+
+        upserts, changes, search_numbers, fitment_numbers = [], [], set(), set()
+        for number, row in rows.items():
+            current = existing.get(number)
+            if current is None:
+                fields = {column: [None, value] for column, value in row.items() if value is not None}
+                counts["inserted"] += 1
+                changes.append(_change(spec.name, "insert", number, fields, sync_id))
+                search_numbers.add(number)
+                fitment_numbers.add(number)
+            else:
+                fields = {column: [current[column], value] for column, value in row.items() if current[column] != value}
+                if not fields:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated"] += 1
+                changes.append(_change(spec.name, "update", number, fields, sync_id))
+                if set(fields) & set(INDEXED_COLUMNS):
+                    search_numbers.add(number)
+                if set(fields) & set(FITMENT_COLUMNS):
+                    fitment_numbers.add(number)
+            upserts.append(row)
+
+        if upserts and not dry_run:
+            with conn:
+                counts["reindexed"] += _apply(conn, spec, upserts, [], search_numbers, fitment_numbers, index_current)
+        for change in changes:
+            changelog(change)
+
+    if delete_missing:
+        counts["deleted"] += _delete_missing(conn, spec, seen, changelog, sync_id, dry_run, index_current,
+                                             chunk_rows, counts)
+    return SyncReport(spec.name, seconds=round(time.perf_counter() - started, 3), **counts)
+
+
+def _delete_missing(conn: sqlite3.Connection, spec: TableSpec, seen: Set[str], changelog, sync_id: str,
+                    dry_run: bool, index_current: bool, chunk_rows: int, counts: Dict[str, int]) -> int:
+    """Remove rows whose part number was not in the export, in batches of chunk_rows."""
+    missing = [(row_id, number) for row_id, number in conn.execute(f"SELECT id, part_number FROM {spec.name}")
+               if number not in seen]
+    for start in range(0, len(missing), chunk_rows):
+        batch = missing[start:start + chunk_rows]
+        if not dry_run:
+            with conn:
+                counts["reindexed"] += _apply(conn, spec, [], [row_id for row_id, _ in batch], set(), set(),
+                                              index_current)
+        for _, number in batch:
+            changelog(_change(spec.name, "delete", number, {}, sync_id))
+    return len(missing)
+
+
+def sync_catalog(exports_dir: Path = EXPORTS_DIR, db_path: Path = DB_PATH, tables: Optional[List[str]] = None,
+                 changelog_path: Optional[Path] = CHANGELOG_PATH, delete_missing: bool = False,
+                 dry_run: bool = False, chunk_rows: int = CHUNK_ROWS) -> List[SyncReport]:
+    """Sync <table>.csv files from exports_dir into the database and append every change to the change log."""
+    sync_id = time.strftime("%Y%m%dT%H%M%S")
+    # The catalog is attached to the index database, so a chunk's rows and its index updates commit together.
+    conn = connect_index(db_path, index_mode="rwc", catalog_mode="rw", timeout=30)
+    conn.row_factory = sqlite3.Row
+    log = None
+    if changelog_path is not None and not dry_run:
+        changelog_path.parent.mkdir(parents=True, exist_ok=True)
+        log = changelog_path.open("a", encoding="utf-8")
+
+    # One JSON line per changed part, so caches can drop just the entries for those part numbers.
+    def changelog(change: dict) -> None:
+        if log is not None:
+            log.write(json.dumps(change, ensure_ascii=False) + "\n")
+
+    reports = []
+    try:
+        for table in tables or list(TABLES):
+            csv_path = exports_dir / f"{table}.csv"
+            if not csv_path.exists():
+                print(f"Skipping {table}: {csv_path} not found")
+                continue
+            reports.append(sync_table(conn, TABLES[table], csv_path, changelog, sync_id,
+                                      delete_missing, dry_run, chunk_rows))
+    finally:
+        if log is not None:
+            log.close()
+        conn.close()
+    return reports
+
+
+def export_table(conn: sqlite3.Connection, table: str, path: Path, batch_rows: int = CHUNK_ROWS) -> int:
+    """Stream a table to CSV batch by batch; the file is replaced only once it is complete."""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    rows = 0
+    cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+    with tmp_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            batch = cursor.fetchmany(batch_rows)
+            if not batch:
+                break
+            writer.writerows(batch)
+            rows += len(batch)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def export_catalog(exports_dir: Path = EXPORTS_DIR, db_path: Path = DB_PATH,
+                   tables: Optional[List[str]] = None) -> Dict[str, int]:
+    exports_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True)
+    try:
+        return {table: export_table(conn, table, exports_dir / f"{table}.csv") for table in tables or list(TABLES)}
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync the CSV exports into the parts database, or export it.")
+    parser.add_argument("mode", choices=("import", "export"), help="import CSVs into the database or export it")
+    parser.add_argument("--exports-dir", type=Path, default=EXPORTS_DIR, help="directory with <table>.csv files")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="SQLite database")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), help="tables to sync (default: all)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per read and per transaction")
+    parser.add_argument("--changelog", type=Path, default=CHANGELOG_PATH, help="JSONL file changes are appended to")
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="delete rows whose part number is not in the CSV (full exports only)")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without writing them")
+    args = parser.parse_args()
+
+    if args.mode == "export":
+        for table, rows in export_catalog(args.exports_dir, args.db, args.tables).items():
+            print(f"✓ Exported {rows} rows from {table} to {args.exports_dir / (table + '.csv')}")
+        return
+
+    reports = sync_catalog(args.exports_dir, args.db, args.tables, args.changelog,
+                           args.delete_missing, args.dry_run, args.chunk_rows)
+    print("| table | read | inserted | updated | unchanged | deleted | skipped | reindexed | seconds |")
+    print("| --- | --- | --- | --- | --- | --- | --- | --- | --- |")
+    for report in reports:
+        print("| " + " | ".join(str(value) for value in report) + " |")
+    if args.dry_run:
+        print("Dry run: nothing was written.")
+
+
+if __name__ == "__main__":
+    main()